@@ -0,0 +1,81 @@
+"""Parse time and peak memory of building the transactions frame.
+
+Usage: python benchmarks/bench_normalize.py [rows]
+"""
+
+import random
+import sys
+import tracemalloc
+from datetime import date, timedelta
+from time import perf_counter
+
+import pandas as pd
+
+from finance.normalize import normalize_transactions
+
+MERCHANTS = ["Amazon", "Starbucks", "Uber", "Shell", "Whole Foods", "Netflix", None]
+CATEGORIES = ["FOOD_AND_DRINK", "TRANSPORTATION", "GENERAL_MERCHANDISE", "INCOME"]
+
+
+def make_records(rows: int) -> list[dict]:
+    rng = random.Random(0)
+    start = date(2015, 1, 1)
+    records = []
+    for i in range(rows):
+        merchant = rng.choice(MERCHANTS)
+        primary = rng.choice(CATEGORIES)
+        records.append(
+            {
+                "transaction_id": f"txn-{i}",
+                "account_id": f"acc-{i % 6}",
+                "date": start + timedelta(days=rng.randrange(3650)),
+                "amount": round(rng.uniform(-500, 500), 2),
+                "name": f"{merchant or 'TRANSFER'} #{rng.randrange(1000)}",
+                "merchant_name": merchant,
+                "category": ["Shops", primary.title()],
+                "payment_channel": rng.choice(["online", "in store", "other"]),
+                "location": {"city": rng.choice(["Boston", None]), "region": "MA"},
+                "personal_finance_category": {
+                    "primary": primary,
+                    "detailed": f"{primary}_OTHER",
+                },
+            }
+        )
+    return records
+
+
+def legacy(transactions: list[dict]) -> pd.DataFrame:
+    data = {key: [i[key] for i in transactions] for key in transactions[0]}
+    df = pd.DataFrame(data)
+    df["datestr"] = [x.strftime("%Y-%m-%d") for x in df["date"]]
+    df["personal_finance_category_primary"] = [
+        x["primary"] if x is not None and "primary" in x else "N/A"
+        for x in df["personal_finance_category"]
+    ]
+    return df
+
+
+def measure(fn, records: list[dict]) -> tuple[float, float, pd.DataFrame]:
+    # Timed separately since tracemalloc slows allocation-heavy code down
+    start = perf_counter()
+    df = fn(records)
+    elapsed = perf_counter() - start
+
+    del df
+    tracemalloc.start()
+    df = fn(records)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, df
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    records = make_records(rows)
+    for name, fn in (("legacy", legacy), ("normalize", normalize_transactions)):
+        elapsed, peak, df = measure(fn, records)
+        frame_mb = df.memory_usage(deep=True).sum() / 2**20
+        print(
+            f"{name:>10}: {elapsed:6.2f} s  peak {peak:7.1f} MiB  "
+            f"frame {frame_mb:6.1f} MiB"
+        )
@@ -0,0 +1,308 @@
+"""Timings of the ingest -> categorize -> aggregate -> render pipeline.
+
+Generates Plaid-shaped /transactions/sync records and applies them as a first
+sync of the whole history (no requests are made, but
+finance/api_keys/keystore.py must exist as for the app), then times
+categorization, the period filters and every chart. Results are written as
+JSON and, given a baseline, compared against it.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--rows 1000 10000] [--rules 10 1000]
+        [--output results.json] [--baseline benchmarks/baseline.json]
+
+Every timing is the median of --repeat runs. Exits with status 1 if a
+median is more than --threshold times its baseline and slower by at least
+--min-delta seconds. Baselines are first scaled by a calibration loop timed
+on both machines, so a slower or busier machine doesn't read as a
+regression. Refresh the baseline with --output benchmarks/baseline.json.
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from time import perf_counter
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import finance.plaid_manager as plaid_manager
+import finance.plotters as plotters
+from finance.plaid_manager import PlaidManager, month_bounds
+from finance.rules import Rules
+
+# (merchant, personal_finance_category primary, detailed)
+MERCHANTS = [
+    ("Amazon", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_ONLINE_MARKETPLACES"),
+    ("Target", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_SUPERSTORES"),
+    ("Walmart", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_SUPERSTORES"),
+    ("Best Buy", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_ELECTRONICS"),
+    ("Starbucks", "FOOD_AND_DRINK", "FOOD_AND_DRINK_COFFEE"),
+    ("Chipotle", "FOOD_AND_DRINK", "FOOD_AND_DRINK_FAST_FOOD"),
+    ("McDonald's", "FOOD_AND_DRINK", "FOOD_AND_DRINK_FAST_FOOD"),
+    ("Whole Foods", "FOOD_AND_DRINK", "FOOD_AND_DRINK_GROCERIES"),
+    ("Trader Joe's", "FOOD_AND_DRINK", "FOOD_AND_DRINK_GROCERIES"),
+    ("DoorDash", "FOOD_AND_DRINK", "FOOD_AND_DRINK_RESTAURANT"),
+    ("Uber", "TRANSPORTATION", "TRANSPORTATION_TAXIS_AND_RIDE_SHARES"),
+    ("Lyft", "TRANSPORTATION", "TRANSPORTATION_TAXIS_AND_RIDE_SHARES"),
+    ("Shell", "TRANSPORTATION", "TRANSPORTATION_GAS"),
+    ("Chevron", "TRANSPORTATION", "TRANSPORTATION_GAS"),
+    ("Delta", "TRAVEL", "TRAVEL_FLIGHTS"),
+    ("Marriott", "TRAVEL", "TRAVEL_LODGING"),
+    ("Airbnb", "TRAVEL", "TRAVEL_LODGING"),
+    ("Netflix", "ENTERTAINMENT", "ENTERTAINMENT_TV_AND_MOVIES"),
+    ("Spotify", "ENTERTAINMENT", "ENTERTAINMENT_MUSIC_AND_AUDIO"),
+    ("Steam", "ENTERTAINMENT", "ENTERTAINMENT_VIDEO_GAMES"),
+    ("CVS", "MEDICAL", "MEDICAL_PHARMACIES_AND_SUPPLEMENTS"),
+    ("Walgreens", "MEDICAL", "MEDICAL_PHARMACIES_AND_SUPPLEMENTS"),
+    ("Comcast", "RENT_AND_UTILITIES", "RENT_AND_UTILITIES_INTERNET_AND_CABLE"),
+    ("Verizon", "RENT_AND_UTILITIES", "RENT_AND_UTILITIES_TELEPHONE"),
+    ("PG&E", "RENT_AND_UTILITIES", "RENT_AND_UTILITIES_GAS_AND_ELECTRICITY"),
+    ("Home Depot", "HOME_IMPROVEMENT", "HOME_IMPROVEMENT_HARDWARE"),
+    ("Planet Fitness", "PERSONAL_CARE", "PERSONAL_CARE_GYMS_AND_FITNESS_CENTERS"),
+    ("Geico", "GENERAL_SERVICES", "GENERAL_SERVICES_INSURANCE"),
+    ("IRS", "GOVERNMENT_AND_NON_PROFIT", "GOVERNMENT_AND_NON_PROFIT_TAX_PAYMENT"),
+    (None, "INCOME", "INCOME_WAGES"),
+    (None, "TRANSFER_IN", "TRANSFER_IN_ACCOUNT_TRANSFER"),
+    (None, "TRANSFER_OUT", "TRANSFER_OUT_ACCOUNT_TRANSFER"),
+    (None, "LOAN_PAYMENTS", "LOAN_PAYMENTS_CREDIT_CARD_PAYMENT"),
+    (None, "BANK_FEES", "BANK_FEES_ATM_FEES"),
+]
+CITIES = [("Boston", "MA"), ("Seattle", "WA"), ("Austin", "TX"), (None, None)]
+ACCOUNTS = [f"acct-{i}" for i in range(6)]
+TOKEN = "access-bench"
+# Never contacted
+ENV = "http://127.0.0.1:9"
+
+
+def make_transactions(rows: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=3650)
+    transactions = []
+    for i in range(rows):
+        merchant, primary, detailed = rng.choice(MERCHANTS)
+        city, region = rng.choice(CITIES)
+        amount = round(rng.lognormvariate(3, 1.2), 2)
+        if primary in ("INCOME", "TRANSFER_IN"):
+            amount = -amount
+        name = (
+            f"{merchant.upper()} #{rng.randrange(10000)}"
+            if merchant
+            else f"{primary.replace('_', ' ')} {rng.randrange(100000)}"
+        )
+        transactions.append(
+            dict(
+                transaction_id=f"txn-{i:08d}",
+                account_id=rng.choice(ACCOUNTS),
+                date=(start + timedelta(days=rng.randrange(3650))).isoformat(),
+                authorized_date=None,
+                amount=amount,
+                iso_currency_code="USD",
+                name=name,
+                merchant_name=merchant,
+                category=[primary.split("_")[0].title(), detailed.title()],
+                payment_channel=rng.choice(["online", "in store", "other"]),
+                pending=False,
+                location={"city": city, "region": region, "country": "US"},
+                payment_meta={"reference_number": None, "payee": None},
+                personal_finance_category={"primary": primary, "detailed": detailed},
+            )
+        )
+    return transactions
+
+
+def make_rules(count: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        merchant, primary, detailed = rng.choice(MERCHANTS)
+        field = rng.choice(["name", "merchant_name", "category"])
+        if field == "category":
+            search_str = detailed.title()
+        elif merchant is not None and i < len(MERCHANTS):
+            search_str = merchant.upper() if field == "name" else merchant
+        else:
+            # Mostly rules that match nothing, as in a long-lived ruleset
+            search_str = f"MERCHANT {rng.randrange(10**6)}"
+        rules.append((search_str, field, f"CUSTOM_{i % 20}"))
+    return pd.DataFrame(rules, columns=Rules.rule_columns)
+
+
+def make_manager(rows: int, directory: Path) -> PlaidManager:
+    # A workspace of its own, so no keys or local caches are read
+    directory = directory / str(rows)
+    directory.mkdir()
+    with patch.object(plaid_manager, "get_plaid", lambda env: ("id", "secret", [])):
+        manager = PlaidManager(ENV, directory)
+    manager.add_token(TOKEN, "bench-item")
+    return manager
+
+
+def use_rules(manager: PlaidManager, rules: pd.DataFrame) -> None:
+    writer = Rules(manager.db_filename)
+    writer.rules = rules
+    writer.save_rules()
+    # Loaded again from the database on next use
+    Rules.release(manager.db_filename)
+
+
+def timed(fn, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times)}
+
+
+def calibrate(repeat: int) -> float:
+    """Median time of a fixed pandas workload, a measure of machine speed."""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {"key": rng.integers(0, 100, 200_000), "value": rng.random(200_000)}
+    )
+    timing = timed(lambda: df.groupby("key")["value"].sum().sort_values(), repeat)
+    return timing["median"]
+
+
+def run(rows_list: list[int], rules_list: list[int], repeat: int) -> dict:
+    results = {}
+    directory = Path(tempfile.mkdtemp())
+    for rows in rows_list:
+        # Large sizes are slow enough that one run is representative
+        n = repeat if rows <= 100_000 else 1
+        manager = make_manager(rows, directory)
+        use_rules(manager, make_rules(0))
+        # A first sync of the whole history: every record is added
+        history = make_transactions(rows)
+        sync = [(history, [], [], "bench-cursor")]
+        results[f"sync/{rows}"] = timed(
+            lambda: manager._apply_sync_results([TOKEN], sync), n
+        )
+        # Then a typical refresh: a few new and changed transactions
+        modified = [{**x, "amount": x["amount"] + 1.0} for x in history[:50]]
+        added = [
+            {**x, "transaction_id": f"new-{i:08d}"}
+            for i, x in enumerate(make_transactions(50, seed=1))
+        ]
+        delta = [(added, modified, [], "bench-cursor")]
+        results[f"sync_delta/{rows}"] = timed(
+            lambda: manager._apply_sync_results([TOKEN], delta), n
+        )
+
+        for count in rules_list:
+            use_rules(manager, make_rules(count))
+            results[f"categorize/{rows}/{count}"] = timed(
+                manager.apply_user_categories, n
+            )
+
+        latest = manager.transactions_all["date"].max()
+        month, year = str(latest.month), str(latest.year)
+        results[f"filter_month/{rows}"] = timed(
+            lambda: manager.transactions_for_month(month, year), n
+        )
+        results[f"filter_year/{rows}"] = timed(
+            lambda: manager.transactions_for_year(year), n
+        )
+        # Uncached, as for the first chart after a sync
+        start, end = (x.isoformat() for x in month_bounds(month, year))
+        results[f"category_totals/{rows}"] = timed(
+            lambda: manager.db.category_totals(start, end), n
+        )
+        results[f"monthly_totals/{rows}"] = timed(
+            lambda: manager.db.monthly_totals("plot_category"), n
+        )
+
+        totals = manager.category_totals(month, year)
+        categories = manager.categories
+        budget = {x: 100.0 for x in categories}
+        balances = pd.DataFrame(
+            {
+                "account_id": ACCOUNTS,
+                "name": [f"Account {i}" for i in range(len(ACCOUNTS))],
+                "balances": np.linspace(100.0, 5000.0, len(ACCOUNTS)),
+            }
+        )
+        balances["balances_str"] = [f"${x:.2f}" for x in balances["balances"]]
+        balances["legend"] = balances["name"]
+        charts = {
+            "table_balances": lambda: plotters.table_balances(balances.copy()),
+            "pie_chart_balances": lambda: plotters.pie_chart_balances(balances.copy()),
+            "bar_graph_budget": lambda: plotters.bar_graph_budget(totals, budget),
+            "pie_chart_transactions_out": lambda: plotters.pie_chart_transactions_out(
+                totals, categories
+            ),
+            "pie_chart_transactions_in": lambda: plotters.pie_chart_transactions_in(
+                totals, categories
+            ),
+        }
+        for name, fn in charts.items():
+            results[f"plot/{name}/{rows}"] = timed(fn, n)
+
+        print(f"{rows} rows done", file=sys.stderr)
+    return results
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    threshold: float,
+    min_delta: float,
+    scale: float = 1.0,
+) -> list[str]:
+    regressions = []
+    for key, timing in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]["median"] * scale
+        ratio = timing["median"] / max(expected, 1e-9)
+        # Millisecond timings are too noisy to go by the ratio alone
+        regressed = ratio > threshold and timing["median"] - expected > min_delta
+        flag = "REGRESSION" if regressed else ""
+        print(f"{key:>50}: {timing['median']:9.4f} s  x{ratio:5.2f} {flag}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--threshold", type=float, default=1.5)
+    parser.add_argument("--min-delta", type=float, default=0.025)
+    args = parser.parse_args()
+
+    calibration = calibrate(args.repeat)
+    results = run(args.rows, args.rules, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "calibration": calibration,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        # Baselines from before calibration was recorded are taken as is
+        scale = calibration / baseline.get("calibration", calibration)
+        print(f"calibration: x{scale:.2f} of the baseline machine")
+        regressions = compare(
+            results, baseline["results"], args.threshold, args.min_delta, scale
+        )
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
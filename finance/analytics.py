@@ -0,0 +1,41 @@
+import pandas as pd
+
+
+def pivot_months(totals: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Long ``month``/``column``/``amount`` totals as one row per month.
+
+    Months without any transactions are filled in with zeros, so that shifts
+    along the index are shifts in calendar months.
+    """
+    if len(totals) == 0:
+        return _empty_totals()
+    totals = totals.pivot(index="month", columns=column, values="amount")
+    totals.index = pd.PeriodIndex(totals.index, freq="M")
+    return _fill_months(totals.fillna(0.0))
+
+
+def rolling_average(totals: pd.DataFrame, window: int) -> pd.DataFrame:
+    return totals.rolling(window, min_periods=1).mean()
+
+
+def month_over_month(totals: pd.DataFrame) -> pd.DataFrame:
+    return totals.diff()
+
+
+def year_over_year(totals: pd.DataFrame) -> pd.DataFrame:
+    # The index has no gaps, so twelve rows back is the same month last year
+    return totals - totals.shift(12)
+
+
+def _empty_totals() -> pd.DataFrame:
+    return pd.DataFrame(index=pd.PeriodIndex([], freq="M"), dtype="float64")
+
+
+def _fill_months(totals: pd.DataFrame) -> pd.DataFrame:
+    totals = totals.sort_index()
+    if len(totals):
+        months = pd.period_range(totals.index.min(), totals.index.max(), freq="M")
+        totals = totals.reindex(months, fill_value=0.0)
+    totals.columns = totals.columns.astype(str)
+    totals.columns.name = None
+    return totals
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import secrets
+import typing as t
+from pathlib import Path
+
+import pandas as pd
+
+from finance.workspace import USER_ID
+
+
+class ApiTokens:
+    """Bearer tokens of the users allowed to call the API.
+
+    Only a SHA-256 of every token is stored, next to the users' workspaces.
+    Tokens are issued with ``scripts/add_user.py``; the file is read again
+    whenever it changes, so new users don't need a restart.
+    """
+
+    filename: Path = Path(__file__).parent / ".users" / ".api_tokens.csv"
+    users: dict[str, str]
+    _mtime: t.Optional[float] = None
+
+    def __init__(self, filename: t.Optional[Path] = None) -> None:
+        if filename is not None:
+            self.filename = filename
+        self.users = {}
+
+    def user_for(self, token: str) -> t.Optional[str]:
+        """The user ``token`` was issued to, or None if it wasn't issued."""
+        self._reload()
+        return self.users.get(_digest(token))
+
+    def issue(self, user_id: str) -> str:
+        if not USER_ID.fullmatch(user_id):
+            raise ValueError(f"invalid user id {user_id!r}")
+        self._reload()
+        token = secrets.token_urlsafe(32)
+        self.users[_digest(token)] = user_id
+        token_df = pd.DataFrame(
+            {"token_sha256": list(self.users), "user_id": list(self.users.values())}
+        )
+        os.makedirs(self.filename.parent, exist_ok=True)
+        tmp = self.filename.with_name(self.filename.name + ".tmp")
+        token_df.to_csv(tmp, index=False)
+        os.replace(tmp, self.filename)
+        return token
+
+    def _reload(self) -> None:
+        try:
+            mtime = os.stat(self.filename).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._mtime:
+            token_df = pd.read_csv(self.filename, dtype=str)
+            self.users = dict(zip(token_df["token_sha256"], token_df["user_id"]))
+            self._mtime = mtime
+
+
+def _digest(token: str) -> str:
+    # Tokens are random, so an unsalted hash is enough to keep them off disk
+    return hashlib.sha256(token.encode()).hexdigest()
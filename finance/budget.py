@@ -1,8 +1,8 @@
-import os
+import typing as t
 from pathlib import Path
 
-import pandas as pd
-
+import finance.metrics as metrics
+from finance.database import Database
 from finance.plaid_manager import PlaidManager
 
 
@@ -10,12 +10,20 @@ class Budget:
 
     categories: list[str]
     budget: dict[str, float]
-    filename = Path(__file__).parent / ".budget.csv"
-
-    def __init__(self, categories: list[str]) -> None:
+    filename = Database.filename
+    db: Database
+
+    @metrics.timed("budget_seconds")
+    def __init__(
+        self, categories: list[str], filename: t.Optional[Path] = None
+    ) -> None:
+        if filename is not None:
+            self.filename = filename
+        self.db = Database.shared(self.filename)
         self.categories = categories
-        if os.path.exists(self.filename):
-            self.budget = pd.read_csv(self.filename).to_dict(orient="records")[0]
+        stored = self.db.budget()
+        self.budget = dict(stored)
+        if self.budget:
             for x in self.categories:
                 if x not in self.budget:
                     self.budget[x] = 0
@@ -27,14 +35,17 @@ class Budget:
             self.budget = {}
             for x in self.categories:
                 self.budget[x] = 0
-        self.save_budget()
+        # Loaded after every refresh, usually with nothing to change
+        if self.budget != stored:
+            self.save_budget()
 
+    @metrics.timed("budget_seconds")
     def save_budget(self) -> None:
-        pd.DataFrame(self.budget, index=[0]).to_csv(self.filename, index=False)
+        self.db.set_budget(self.budget)
 
     def set_category(self, category: str, value: float) -> None:
         self.budget[category] = value
-        self.save_budget()
+        self.db.set_budget_amount(category, value)
 
     def get_category(self, category: str) -> float:
         return self.budget[category]
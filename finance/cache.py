@@ -0,0 +1,93 @@
+import os
+import typing as t
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+def save_frame(
+    df: pd.DataFrame, filename: Path, metadata: t.Optional[dict[str, str]] = None
+) -> bool:
+    """Write ``df`` to an Arrow IPC (Feather v2) file, atomically.
+
+    ``metadata`` is stored with it, see ``frame_metadata``. Returns False
+    (leaving any previous file in place) if a column cannot be represented in
+    Arrow, so that a bad cache never breaks a refresh.
+    """
+    try:
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    except pa.ArrowException as exc:
+        print(f"failed to cache {filename.name}: {exc}")
+        return False
+    if metadata:
+        table = table.replace_schema_metadata(
+            {
+                **(table.schema.metadata or {}),
+                **{k.encode(): v.encode() for k, v in metadata.items()},
+            }
+        )
+
+    tmp = filename.with_name(filename.name + ".tmp")
+    # Uncompressed so the file can be memory-mapped on load
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, filename)
+    return True
+
+
+def load_frame(filename: Path) -> t.Optional[pd.DataFrame]:
+    if not os.path.exists(filename):
+        return None
+    try:
+        table = feather.read_table(filename, memory_map=True)
+    except (pa.ArrowException, OSError) as exc:
+        print(f"failed to load {filename.name}: {exc}")
+        return None
+    return table.to_pandas()
+
+
+def frame_metadata(filename: Path) -> dict[str, str]:
+    """The metadata ``filename`` was saved with, empty if it can't be read."""
+    try:
+        schema = feather.read_table(filename, memory_map=True).schema
+    except (pa.ArrowException, OSError):
+        return {}
+    return {
+        k.decode(): v.decode()
+        for k, v in (schema.metadata or {}).items()
+        if k != b"pandas"
+    }
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry."""
+
+    maxsize: int
+    entries: OrderedDict
+    lock: Lock
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: t.Hashable) -> t.Any:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: t.Hashable, value: t.Any) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
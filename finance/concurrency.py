@@ -0,0 +1,47 @@
+import asyncio
+import random
+import typing as t
+
+T = t.TypeVar("T")
+R = t.TypeVar("R")
+
+
+async def gather_bounded(
+    fn: t.Callable[[T], t.Awaitable[R]], items: t.Iterable[T], max_workers: int
+) -> list[R]:
+    """Await ``fn`` on every item, at most ``max_workers`` at a time.
+
+    Results are returned in the order of ``items`` regardless of completion
+    order.
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def run(x: T) -> R:
+        async with semaphore:
+            return await fn(x)
+
+    return list(await asyncio.gather(*(run(x) for x in items)))
+
+
+async def async_call_with_retries(
+    fn: t.Callable[[], t.Awaitable[R]],
+    should_retry: t.Callable[[Exception], bool],
+    retries: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 10.0,
+) -> R:
+    """Await ``fn``, retrying retryable failures with jittered exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return await fn()
+        except Exception as exc:
+            if attempt == retries or not should_retry(exc):
+                raise
+            await asyncio.sleep(backoff(attempt, base_delay, max_delay))
+    raise AssertionError("unreachable")
+
+
+def backoff(attempt: int, base_delay: float, max_delay: float = 10.0) -> float:
+    # "Full jitter": a random delay up to the exponential cap, so that
+    # concurrent callers don't retry in lockstep
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
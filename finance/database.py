@@ -0,0 +1,401 @@
+import contextlib
+import json
+import os
+import sqlite3
+import typing as t
+from datetime import date
+from pathlib import Path
+from threading import Lock, local
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    account_id TEXT,
+    amount REAL NOT NULL,
+    plot_category TEXT,
+    record TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date);
+
+CREATE INDEX IF NOT EXISTS transactions_account ON transactions (account_id, date);
+
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (plot_category, date);
+
+CREATE TABLE IF NOT EXISTS cursors (
+    token TEXT PRIMARY KEY,
+    cursor TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    search_str TEXT NOT NULL,
+    transaction_field TEXT NOT NULL,
+    categorize TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS budgets (
+    category TEXT PRIMARY KEY,
+    amount REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS items (
+    token TEXT PRIMARY KEY,
+    env TEXT NOT NULL,
+    item_id TEXT
+);
+"""
+
+BUDGET_UPSERT = (
+    "INSERT INTO budgets VALUES (?, ?) "
+    "ON CONFLICT (category) DO UPDATE SET amount = excluded.amount"
+)
+
+TRANSACTION_INSERT = (
+    "INSERT OR REPLACE INTO transactions "
+    "(transaction_id, date, account_id, amount, plot_category, record) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# Columns the monthly totals can be grouped by
+TOTALS_COLUMNS: set[str] = {"plot_category", "account_id"}
+
+# Top-level record fields the Plaid SDK returns as date or datetime objects
+DATE_FIELDS: list[str] = ["date", "authorized_date", "datetime", "authorized_datetime"]
+
+# Bumped whenever SCHEMA changes
+SCHEMA_VERSION = 3
+
+Row = tuple[t.Any, ...]
+
+
+class Database:
+    """Embedded SQLite store for transactions, rules, budgets and items.
+
+    Use ``Database.shared()`` to get the instance for a file. Writes share one
+    connection, serialized by a lock, and each runs in one transaction, so a
+    crash or a concurrent reader never sees half of it. Every thread reads on
+    its own connection, so readers don't wait for writers (WAL mode). On
+    creation, the files that held this data before are imported from the
+    same directory.
+
+    Transactions are kept as the Plaid JSON records last synced, next to the
+    sync cursor of every item, with the columns the charts aggregate on
+    (date, account and plotted category) indexed alongside.
+    """
+
+    filename = Path(__file__).parent / ".finance.db"
+    connection: sqlite3.Connection
+    lock: Lock
+    # Read connections, one per thread, and the lock guarding the list
+    readers: list[sqlite3.Connection]
+    readers_lock: Lock
+
+    _shared: dict[Path, "Database"] = {}
+    _shared_lock = Lock()
+
+    def __init__(self, filename: t.Optional[Path] = None) -> None:
+        if filename is not None:
+            self.filename = filename
+        self.lock = Lock()
+        self.readers = []
+        self.readers_lock = Lock()
+        self._local = local()
+        self.connection = self._connect()
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.transaction() as cursor:
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version == 1:
+                # Version 1 mirrored the categorized frame, without the records
+                cursor.execute("DROP TABLE IF EXISTS transactions")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    cursor.execute(statement)
+            if version == 0:
+                self._import_csv(cursor)
+            if version < 3:
+                self._import_store(cursor)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode, transactions are opened explicitly by transaction().
+        # Connections are closed by close(), possibly from another thread
+        return sqlite3.connect(
+            self.filename, check_same_thread=False, isolation_level=None
+        )
+
+    @classmethod
+    def shared(cls, filename: t.Optional[Path] = None) -> "Database":
+        filename = Path(filename or cls.filename)
+        with cls._shared_lock:
+            if filename not in cls._shared:
+                cls._shared[filename] = cls(filename)
+            return cls._shared[filename]
+
+    @classmethod
+    def release(cls, filename: t.Optional[Path] = None) -> None:
+        """Close the shared instance for ``filename``; it is reopened on next use."""
+        with cls._shared_lock:
+            database = cls._shared.pop(Path(filename or cls.filename), None)
+        if database is not None:
+            database.close()
+
+    def close(self) -> None:
+        with self.lock, self.readers_lock:
+            for connection in [self.connection, *self.readers]:
+                connection.close()
+            self.readers = []
+
+    @contextlib.contextmanager
+    def transaction(self) -> t.Iterator[sqlite3.Cursor]:
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple = ()) -> list[Row]:
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = self._local.reader = self._connect()
+            with self.readers_lock:
+                self.readers.append(reader)
+        return reader.execute(sql, params).fetchall()
+
+    def _import_csv(self, cursor: sqlite3.Cursor) -> None:
+        directory = self.filename.parent
+        if os.path.exists(directory / ".rules.csv"):
+            rules = pd.read_csv(directory / ".rules.csv").astype(str)
+            cursor.executemany(
+                "INSERT INTO rules (search_str, transaction_field, categorize) "
+                "VALUES (?, ?, ?)",
+                rules[["search_str", "transaction_field", "categorize"]].itertuples(
+                    index=False
+                ),
+            )
+        if os.path.exists(directory / ".budget.csv"):
+            budget = pd.read_csv(directory / ".budget.csv").to_dict(orient="records")
+            if budget:
+                cursor.executemany(
+                    "INSERT INTO budgets VALUES (?, ?)",
+                    [(k, float(v)) for k, v in budget[0].items()],
+                )
+        for tokens in (
+            directory / ".access_tokens.csv",
+            directory / "api_keys/.access_tokens.csv",
+        ):
+            if os.path.exists(tokens):
+                token_df = pd.read_csv(tokens, dtype=str)
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO items (token, env) VALUES (?, ?)",
+                    token_df[["token", "env"]].itertuples(index=False),
+                )
+
+    def _import_store(self, cursor: sqlite3.Cursor) -> None:
+        # Synced records and cursors were pickled and CSV files before
+        directory = self.filename.parent
+        if os.path.exists(directory / ".transactions.pkl"):
+            records = pd.read_pickle(directory / ".transactions.pkl").values()
+            cursor.executemany(
+                TRANSACTION_INSERT, _transaction_rows([_plain(x) for x in records])
+            )
+        if os.path.exists(directory / ".cursors.csv"):
+            cursor_df = pd.read_csv(directory / ".cursors.csv", dtype=str).fillna("")
+            cursor.executemany(
+                "INSERT OR REPLACE INTO cursors VALUES (?, ?)",
+                cursor_df[["token", "cursor"]].itertuples(index=False),
+            )
+
+    # Transactions
+
+    def transactions(self) -> tuple[list[dict[str, t.Any]], list[t.Optional[str]]]:
+        """Every stored record, and the category it was last plotted under."""
+        rows = self.query("SELECT record, plot_category FROM transactions")
+        return [json.loads(x[0]) for x in rows], [x[1] for x in rows]
+
+    def transaction_count(self) -> int:
+        return self.query("SELECT COUNT(*) FROM transactions")[0][0]
+
+    def set_transactions(self, records: list[dict[str, t.Any]]) -> None:
+        """Replace every stored record, leaving the cursors as they are."""
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM transactions")
+            cursor.executemany(TRANSACTION_INSERT, _transaction_rows(records))
+
+    def apply_sync(
+        self,
+        token: str,
+        next_cursor: str,
+        records: list[dict[str, t.Any]],
+        removed: list[str],
+        categories: t.Optional[list[str]] = None,
+    ) -> None:
+        """Apply one item's added/modified ``records`` and ``removed`` ids.
+
+        ``categories`` are the records' plotted categories, if known. The
+        item's cursor moves in the same transaction, so after a crash the
+        delta is either applied with its cursor or fetched again.
+        """
+        with self.transaction() as cursor:
+            cursor.executemany(
+                "DELETE FROM transactions WHERE transaction_id = ?",
+                [(x,) for x in removed],
+            )
+            cursor.executemany(
+                TRANSACTION_INSERT, _transaction_rows(records, categories)
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO cursors VALUES (?, ?)", (token, next_cursor)
+            )
+
+    def cursors(self) -> dict[str, str]:
+        return dict(self.query("SELECT token, cursor FROM cursors"))
+
+    def set_categories(self, ids: list[str], categories: list[str]) -> None:
+        with self.transaction() as cursor:
+            cursor.executemany(
+                "UPDATE transactions SET plot_category = ? WHERE transaction_id = ?",
+                zip(categories, ids),
+            )
+
+    def category_totals(self, start: str, end: str) -> pd.Series:
+        """Signed sum of ``amount`` per ``plot_category`` between two days."""
+        rows = self.query(
+            "SELECT plot_category, SUM(amount) FROM transactions "
+            "WHERE date BETWEEN ? AND ? AND plot_category IS NOT NULL "
+            "GROUP BY plot_category",
+            (start, end),
+        )
+        return pd.Series(
+            [x[1] for x in rows],
+            index=pd.Index([x[0] for x in rows], name="plot_category"),
+            name="amount",
+            dtype="float64",
+        )
+
+    def monthly_totals(self, column: str) -> pd.DataFrame:
+        """Signed sum of ``amount`` per month ("YYYY-MM") and ``column`` value."""
+        if column not in TOTALS_COLUMNS:
+            raise ValueError(f"cannot total by {column!r}")
+        rows = self.query(
+            f"SELECT substr(date, 1, 7), {column}, SUM(amount) FROM transactions "
+            f"WHERE {column} IS NOT NULL GROUP BY 1, 2"
+        )
+        return pd.DataFrame(rows, columns=["month", column, "amount"])
+
+    # Rules
+
+    def rules(self) -> pd.DataFrame:
+        rows = self.query(
+            "SELECT id, search_str, transaction_field, categorize FROM rules "
+            "ORDER BY id"
+        )
+        return pd.DataFrame(
+            rows, columns=["id", "search_str", "transaction_field", "categorize"]
+        )
+
+    def add_rule(self, search_str: str, transaction_field: str, categorize: str) -> int:
+        with self.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO rules (search_str, transaction_field, categorize) "
+                "VALUES (?, ?, ?)",
+                (search_str, transaction_field, categorize),
+            )
+            return cursor.lastrowid
+
+    def remove_rule(self, id: int) -> None:
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM rules WHERE id = ?", (id,))
+
+    def set_rules(self, rules: pd.DataFrame) -> list[int]:
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM rules")
+            ids = []
+            for row in rules[
+                ["search_str", "transaction_field", "categorize"]
+            ].itertuples(index=False):
+                cursor.execute(
+                    "INSERT INTO rules (search_str, transaction_field, categorize) "
+                    "VALUES (?, ?, ?)",
+                    tuple(row),
+                )
+                ids.append(cursor.lastrowid)
+            return ids
+
+    # Budgets
+
+    def budget(self) -> dict[str, float]:
+        return dict(self.query("SELECT category, amount FROM budgets"))
+
+    def set_budget(self, budget: dict[str, float]) -> None:
+        """Replace the budget with ``budget``."""
+        with self.transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM budgets WHERE category NOT IN "
+                f"({', '.join('?' * len(budget))})",
+                tuple(budget),
+            )
+            cursor.executemany(
+                BUDGET_UPSERT, [(k, float(v)) for k, v in budget.items()]
+            )
+
+    def set_budget_amount(self, category: str, amount: float) -> None:
+        with self.transaction() as cursor:
+            cursor.execute(BUDGET_UPSERT, (category, float(amount)))
+
+    # Items
+
+    def tokens(self, env: str) -> list[str]:
+        rows = self.query(
+            "SELECT token FROM items WHERE env = ? ORDER BY rowid", (env,)
+        )
+        return [x[0] for x in rows]
+
+    def item_tokens(self) -> dict[str, str]:
+        return dict(
+            self.query("SELECT item_id, token FROM items WHERE item_id IS NOT NULL")
+        )
+
+    def add_item(self, token: str, env: str, item_id: t.Optional[str] = None) -> None:
+        with self.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO items (token, env, item_id) VALUES (?, ?, ?) "
+                "ON CONFLICT (token) DO UPDATE SET "
+                "item_id = COALESCE(excluded.item_id, item_id)",
+                (token, env, item_id),
+            )
+
+
+def _transaction_rows(
+    records: list[dict[str, t.Any]], categories: t.Optional[list[str]] = None
+) -> t.Iterator[Row]:
+    # Without categories, they're set once the records are categorized
+    if categories is None:
+        categories = [None] * len(records)
+    for x, category in zip(records, categories):
+        yield (
+            x["transaction_id"],
+            str(x["date"])[:10],
+            x.get("account_id"),
+            float(x["amount"]),
+            category,
+            json.dumps(x),
+        )
+
+
+def _plain(transaction: dict[str, t.Any]) -> dict[str, t.Any]:
+    # Stores written by the SDK-based sync hold date objects
+    if all(isinstance(transaction.get(x), (str, type(None))) for x in DATE_FIELDS):
+        return transaction
+    return {
+        k: v.isoformat() if k in DATE_FIELDS and isinstance(v, date) else v
+        for k, v in transaction.items()
+    }
@@ -0,0 +1,103 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from finance.history import BalanceHistory
+from finance.smartsheet_manager import SmartsheetManager
+
+
+class SmartsheetExporter:
+    """Pushes transactions and balance snapshots to Smartsheet.
+
+    A hash of every exported row is kept locally, so each run only sends rows
+    that are new or changed. Hashes are saved after every chunk, so an
+    interrupted export resumes where it stopped.
+    """
+
+    manager: SmartsheetManager
+    state_filename = Path(__file__).parent / ".export_state.csv"
+    hashes: dict[str, dict[str, str]]
+    transactions_sheet: str = "Transactions"
+    balances_sheet: str = "Balances"
+    transaction_columns: list[str] = [
+        "transaction_id",
+        "datestr",
+        "name",
+        "merchant_name",
+        "amount",
+        "account_id",
+        "plot_category",
+    ]
+    checkpoint_rows: int = 2000
+
+    def __init__(self, manager: SmartsheetManager) -> None:
+        self.manager = manager
+        self.hashes = {}
+        if os.path.exists(self.state_filename):
+            state = pd.read_csv(self.state_filename, dtype=str)
+            for sheet, group in state.groupby("sheet"):
+                self.hashes[sheet] = dict(zip(group["key"], group["hash"]))
+
+    def save_state(self) -> None:
+        state = pd.DataFrame(
+            [
+                (sheet, key, hash_)
+                for sheet, hashes in self.hashes.items()
+                for key, hash_ in hashes.items()
+            ],
+            columns=["sheet", "key", "hash"],
+        )
+        tmp = self.state_filename.with_name(self.state_filename.name + ".tmp")
+        state.to_csv(tmp, index=False)
+        os.replace(tmp, self.state_filename)
+
+    def run(self, transactions: pd.DataFrame, history: BalanceHistory) -> None:
+        columns = [x for x in self.transaction_columns if x in transactions.columns]
+        sent = self.export(
+            self.transactions_sheet, transactions[columns], "transaction_id"
+        )
+        print(f"exported {sent} transactions")
+
+        balances = history.read()
+        balances = pd.DataFrame(
+            {
+                "snapshot_id": (
+                    balances["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+                    + "/"
+                    + balances["account_id"].astype(str)
+                ),
+                "timestamp": balances["timestamp"].dt.strftime("%Y/%m/%d - %H:%M:%S"),
+                "account_id": balances["account_id"].astype(str),
+                "name": balances["name"].astype(str),
+                "balance": balances["balance"],
+            }
+        )
+        sent = self.export(self.balances_sheet, balances, "snapshot_id")
+        print(f"exported {sent} balance snapshots")
+
+    def export(self, sheet: str, df: pd.DataFrame, key: str) -> int:
+        """Upsert the rows of ``df`` that changed since the last export."""
+        keys = df[key].astype(str).to_numpy()
+        row_hashes = pd.util.hash_pandas_object(df, index=False).astype(str).to_numpy()
+        exported = self.hashes.setdefault(sheet, {})
+        changed = [
+            i for i, (x, y) in enumerate(zip(keys, row_hashes)) if exported.get(x) != y
+        ]
+        if not changed:
+            return 0
+
+        sheet_id = self.manager.get_sheet_id(sheet)
+        # Downloaded once, every chunk updates it with what it sent
+        index = self.manager.index_sheet(sheet_id, key)
+        for start in range(0, len(changed), self.checkpoint_rows):
+            rows = changed[start : start + self.checkpoint_rows]
+            chunk = df.iloc[rows].astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            self.manager.upsert_rows(
+                sheet_id, {x: chunk[x].tolist() for x in chunk.columns}, key, index
+            )
+            # Checkpoint, so a failure after this point doesn't resend the chunk
+            exported.update(zip(keys[rows], row_hashes[rows]))
+            self.save_state()
+        return len(changed)
@@ -0,0 +1,145 @@
+import os
+import typing as t
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from finance.cache import load_frame, save_frame
+
+
+class BalanceHistory:
+    """Per-account balance snapshots, kept as Arrow files per year.
+
+    Every refresh adds one row per account, written as a small file of its own
+    (``<year>_<timestamp>_<id>.arrow``), so appending doesn't depend on how
+    much history there is. Once a year has ``compact_every`` of them, they are
+    merged into the year's ``<year>.arrow``. A range query reads just the years
+    it spans and slices them by binary search.
+    """
+
+    directory: Path = Path(__file__).parent / ".balance_history"
+    columns: list[str] = ["timestamp", "account_id", "name", "balance"]
+    compact_every: int = 50
+
+    def __init__(self, directory: t.Optional[Path] = None) -> None:
+        if directory is not None:
+            self.directory = directory
+
+    def append(
+        self, balances: pd.DataFrame, timestamp: t.Optional[datetime] = None
+    ) -> None:
+        if len(balances) == 0:
+            return
+        timestamp = pd.Timestamp(timestamp or datetime.now()).floor("s")
+        snapshot = pd.DataFrame(
+            {
+                "timestamp": timestamp,
+                "account_id": balances["account_id"].astype(str).to_numpy(),
+                "name": balances["name"].astype(str).to_numpy(),
+                "balance": balances["balances"].astype("float64").to_numpy(),
+            }
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{timestamp.year}_{timestamp.value}_{uuid.uuid4().hex[:8]}.arrow"
+        save_frame(snapshot, self.directory / name)
+        if len(self._pending(timestamp.year)) >= self.compact_every:
+            self.compact(timestamp.year)
+
+    def compact(self, year: int) -> None:
+        """Merge a year's snapshot files into its yearly file."""
+        pending = self._pending(year)
+        df = self._load_year(year, pending)
+        if df is None:
+            return
+        for column in ("account_id", "name"):
+            df[column] = df[column].astype("category")
+        # Written before the snapshots are removed; a crash in between leaves
+        # rows in both, which reads drop as duplicates
+        if save_frame(df, self._filename(year)):
+            for x in pending:
+                os.remove(x)
+
+    def read(
+        self, start: t.Optional[date] = None, end: t.Optional[date] = None
+    ) -> pd.DataFrame:
+        """Snapshots taken on the days from ``start`` to ``end``, inclusive."""
+        years = sorted(
+            {
+                int(x.stem.split("_")[0])
+                for x in self.directory.glob("*.arrow")
+                if x.stem.split("_")[0].isdigit()
+            }
+        )
+        years = [
+            x
+            for x in years
+            if (start is None or x >= start.year) and (end is None or x <= end.year)
+        ]
+        frames = [self._load_year(x, self._pending(x)) for x in years]
+        frames = [x for x in frames if x is not None]
+        if not frames:
+            return pd.DataFrame(
+                {
+                    "timestamp": pd.Series(dtype="datetime64[ns]"),
+                    "account_id": pd.Series(dtype="object"),
+                    "name": pd.Series(dtype="object"),
+                    "balance": pd.Series(dtype="float64"),
+                }
+            )
+
+        df = pd.concat(frames, ignore_index=True)
+        timestamps = df["timestamp"].values
+        lo, hi = 0, len(df)
+        if start is not None:
+            lo = np.searchsorted(timestamps, np.datetime64(start, "ns"), side="left")
+        if end is not None:
+            end_ = np.datetime64(end, "ns") + np.timedelta64(1, "D")
+            hi = np.searchsorted(timestamps, end_, side="left")
+        return df.iloc[lo:hi].reset_index(drop=True)
+
+    def net_worth(
+        self,
+        start: t.Optional[date] = None,
+        end: t.Optional[date] = None,
+        freq: t.Optional[str] = None,
+    ) -> pd.Series:
+        """Net worth over time, keeping the last snapshot of every ``freq`` bucket.
+
+        Without ``freq``, daily, weekly or monthly points are picked from the
+        length of the range.
+        """
+        df = self.read(start, end)
+        totals = df.groupby("timestamp")["balance"].sum()
+        if len(totals) == 0:
+            return totals
+        if freq is None:
+            days = (totals.index[-1] - totals.index[0]).days
+            freq = "D" if days <= 92 else "W" if days <= 2 * 365 else "M"
+        return totals.resample(freq).last().dropna()
+
+    def _filename(self, year: int) -> Path:
+        return self.directory / f"{year}.arrow"
+
+    def _pending(self, year: int) -> list[Path]:
+        # Snapshot files not compacted yet, oldest first
+        return sorted(
+            self.directory.glob(f"{year}_*.arrow"),
+            key=lambda x: int(x.stem.split("_")[1]),
+        )
+
+    def _load_year(self, year: int, pending: list[Path]) -> t.Optional[pd.DataFrame]:
+        frames = [load_frame(x) for x in [self._filename(year), *pending]]
+        frames = [x for x in frames if x is not None]
+        if not frames:
+            return None
+        if len(frames) == 1:
+            return frames[0]
+        df = pd.concat(
+            [x.astype({"account_id": str, "name": str}) for x in frames],
+            ignore_index=True,
+        )
+        df = df.drop_duplicates(["timestamp", "account_id"], keep="last")
+        return df.sort_values("timestamp", kind="stable", ignore_index=True)
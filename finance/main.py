@@ -1,33 +1,88 @@
+import asyncio
+import hashlib
 import json
+import os
 import typing as t
+from datetime import date
+from types import ModuleType
 
+import pandas as pd
 import plaid
+import pyarrow as pa
 import uvicorn
-from bokeh.embed import json_item
-from fastapi import FastAPI
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from plaid.api import plaid_api
-from plaid.exceptions import ApiException
-from plaid.model.country_code import CountryCode
-from plaid.model.link_token_create_request_user import LinkTokenCreateRequestUser
-from plaid.model.products import Products
-from pydantic import BaseModel
-
-import finance.plotters as plotters
-from finance.budget import Budget
-from finance.plaid_manager import PlaidManager
-from finance.rules import Rules
-from finance.smartsheet_manager import SmartsheetManager
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-APP = FastAPI()
+import finance.analytics as analytics
+import finance.metrics as metrics
+import finance.streaming as streaming
+from finance.auth import ApiTokens
+from finance.plaid_manager import month_bounds, year_bounds
+from finance.webhooks import REFRESH_WEBHOOK_CODES, WebhookVerifier
+from finance.workspace import DEFAULT_USER, Workspace, Workspaces
+
+if t.TYPE_CHECKING:
+    from finance.export import SmartsheetExporter
 
+APP = FastAPI()
 
-plaid_app: PlaidManager
-budget: Budget
+# Public URL of /plaid/webhook/, registered with new links when set
+WEBHOOK_URL = os.environ.get("PLAID_WEBHOOK_URL")
+# Seconds to wait for a burst of webhooks to settle before refreshing, and at
+# most after the first one
+WEBHOOK_DEBOUNCE = 5.0
+WEBHOOK_MAX_WAIT = 60.0
+# Export to Smartsheet after every refresh when set
+SMARTSHEET_EXPORT = bool(os.environ.get("SMARTSHEET_EXPORT"))
+# Rows per page of paginated transactions
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+# Periods as sent by the frontend, e.g. month "3" or "03" and year "2023"
+MONTH = r"^(0?[1-9]|1[0-2])$"
+YEAR = r"^\d{4}$"
+
+
+workspaces: Workspaces
+api_tokens: ApiTokens
+webhook_verifier: WebhookVerifier
+exporter: t.Optional["SmartsheetExporter"] = None
+export_task: t.Optional[asyncio.Task] = None
+# Set by a refresh that lands while an export is running
+export_dirty = False
+
+
+if metrics.ENABLED:
+
+    @APP.middleware("http")
+    async def record_timings(request: Request, call_next):
+        timings = metrics.collect_timings()
+        try:
+            with metrics.timer("http_request_seconds", path=request.url.path):
+                response = await call_next(request)
+        finally:
+            timings.close()
+        if timings.entries:
+            response.headers["Server-Timing"] = metrics.server_timing(timings.entries)
+        return response
+
+
+@APP.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @APP.on_event("startup")
-def startup():
+async def startup():
     APP.add_middleware(
         CORSMiddleware,
         allow_origins=json.dumps(["http://127.0.0.1:5173"]),
@@ -44,31 +99,96 @@ def startup():
     env = plaid.Environment.Development
 
     # Get managers
-    global plaid_app
-    plaid_app = PlaidManager(env)
-    # smart = SmartsheetManager()
-
-    # Get data
-    try:
-        refresh()
-    except ApiException:
+    if SMARTSHEET_EXPORT:
+        # The Smartsheet SDK is only imported when exporting is enabled
+        from finance.export import SmartsheetExporter
+        from finance.smartsheet_manager import SmartsheetManager
+
+        global exporter
+        exporter = SmartsheetExporter(SmartsheetManager())
+
+    # Each user's data is loaded on their first request. The default user is
+    # loaded up front, as the single-user server always did
+    global workspaces, api_tokens, webhook_verifier
+    workspaces = Workspaces(env, on_refresh=refreshed)
+    api_tokens = ApiTokens()
+    webhook_verifier = WebhookVerifier(fetch_webhook_key)
+    async with workspaces.lease(DEFAULT_USER):
         pass
 
 
+@APP.on_event("shutdown")
+async def shutdown():
+    await workspaces.close()
+
+
+def user(authorization: t.Optional[str] = Header(None)) -> str:
+    # Callers authenticate with a token from scripts/add_user.py
+    scheme, _, token = (authorization or "").partition(" ")
+    user_id = api_tokens.user_for(token) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(
+            status_code=401,
+            detail="missing or invalid API token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
+
+
+async def workspace(user_id: str = Depends(user)) -> t.AsyncIterator[Workspace]:
+    # Held until the response is sent, so it isn't closed under the request
+    async with workspaces.lease(user_id) as ws:
+        yield ws
+
+
+async def fetch_webhook_key(key_id: str) -> dict[str, t.Any]:
+    async with workspaces.lease(DEFAULT_USER) as ws:
+        client = ws.plaid_app.async_client
+        response = await client.webhook_verification_key_get(key_id)
+    return response["key"]
+
+
+def refreshed(ws: Workspace):
+    # The export runs on its own so it never holds up the next refresh; if
+    # one is still going, it runs again with this refresh's data when done.
+    # Only the default user's data is exported
+    global export_task, export_dirty
+    if ws.user_id != DEFAULT_USER or exporter is None:
+        return
+    if export_task is None or export_task.done():
+        export_task = asyncio.create_task(run_export(ws))
+    else:
+        export_dirty = True
+
+
+async def run_export(ws: Workspace):
+    global export_dirty
+    while True:
+        export_dirty = False
+        try:
+            await asyncio.to_thread(
+                exporter.run, ws.plaid_app.transactions_all, ws.plaid_app.history
+            )
+        except Exception as exc:
+            print(f"smartsheet export failed: {exc!r}")
+        if not export_dirty:
+            return
+
+
 @APP.get("/refresh_data/")
-def refresh():
-    # Update balances and transactions
-    plaid_app.get_balances()
-    plaid_app.get_transactions()
-
-    # Load budget
-    global budget
-    budget = Budget(plaid_app.categories)
-
-    # # Create bokeh plots
-    # plotters.pie_chart_balances(plaid_app.balances)
-    # plotters.pie_chart_transactions(plaid_app.transactions, plaid_app.categories)
-    return "success"
+async def refresh(ws: Workspace = Depends(workspace)):
+    # Readers keep getting the current snapshot until the job swaps in the
+    # new one; poll /refresh_status/ for completion
+    return json.dumps(ws.scheduler.trigger().to_dict())
+
+
+@APP.get("/refresh_status/")
+def refresh_status(job_id: t.Optional[int] = None, ws: Workspace = Depends(workspace)):
+    scheduler = ws.scheduler
+    job = scheduler.latest() if job_id is None else scheduler.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown refresh job")
+    return json.dumps(job.to_dict())
 
 
 class RulesRemove(BaseModel):
@@ -82,9 +202,9 @@ class RulesAdd(BaseModel):
 
 
 @APP.get("/rules/")
-def get_rules():
+def get_rules(ws: Workspace = Depends(workspace)):
     rule_list = []
-    for index, rule in Rules().rules.iterrows():
+    for index, rule in ws.plaid_app.rules().rules.iterrows():
         rule_list.append(
             (index, rule["search_str"], rule["transaction_field"], rule["categorize"])
         )
@@ -92,22 +212,16 @@ def get_rules():
 
 
 @APP.post("/rules/remove/")
-def remove_rule(param: RulesRemove):
-    Rules().remove_rule(param.index)
-    plaid_app.apply_user_categories()
-
-    global budget
-    budget = Budget(plaid_app.categories)
+def remove_rule(param: RulesRemove, ws: Workspace = Depends(workspace)):
+    ws.plaid_app.remove_rule(param.index)
+    ws.load_budget()
     return "success"
 
 
 @APP.post("/rules/add/")
-def remove_rule(param: RulesAdd):
-    Rules().add_rule(param.search_str, param.transaction_field, param.categorize)
-    plaid_app.apply_user_categories()
-
-    global budget
-    budget = Budget(plaid_app.categories)
+def remove_rule(param: RulesAdd, ws: Workspace = Depends(workspace)):
+    ws.plaid_app.add_rule(param.search_str, param.transaction_field, param.categorize)
+    ws.load_budget()
     return "success"
 
 
@@ -116,79 +230,338 @@ class BudgetParam(BaseModel):
 
 
 @APP.get("/budget/")
-def get_budget():
-    return json.dumps(budget.budget)
+def get_budget(ws: Workspace = Depends(workspace)):
+    return json.dumps(ws.budget.budget)
 
 
 @APP.post("/budget/")
-def set_budget(param: BudgetParam):
-    budget.budget = param.budget
-    budget.save_budget()
+def set_budget(param: BudgetParam, ws: Workspace = Depends(workspace)):
+    ws.budget.budget = param.budget
+    ws.budget.save_budget()
+    ws.budget_changed()
     return "success"
 
 
+def cached_chart(
+    ws: Workspace,
+    request: Request,
+    key: tuple,
+    build: t.Callable[[ModuleType], t.Any],
+) -> Response:
+    # Serialized chart payloads are cached per user, keyed by chart, period
+    # and data/budget versions. Keys include the versions, so a chart built
+    # from a snapshot that was replaced mid-request can never be served
+    # afterwards
+    chart_cache = ws.chart_cache
+    entry = chart_cache.get(key)
+    metrics.inc("chart_cache_total", result="miss" if entry is None else "hit")
+    if entry is None:
+        # Bokeh and the chart builders are imported on the first miss rather
+        # than at startup
+        import finance.plotters as plotters
+        from bokeh.embed import json_item
+
+        # Encoded twice to match the JSON string the endpoints always returned
+        figure = build(plotters)
+        with metrics.timer("chart_serialize_seconds"):
+            payload = json.dumps(json.dumps(json_item(figure))).encode()
+        etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+        entry = (payload, etag)
+        chart_cache.put(key, entry)
+
+    payload, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
 @APP.get("/table_balances/")
-def table_balances():
-    p = plotters.table_balances(plaid_app.balances)
-    return json.dumps(json_item(p))
+def table_balances(request: Request, ws: Workspace = Depends(workspace)):
+    plaid_app = ws.plaid_app
+    balances = plaid_app.balances
+    key = ("table_balances", plaid_app.data_version)
+    return cached_chart(
+        ws, request, key, lambda plotters: plotters.table_balances(balances)
+    )
 
 
 @APP.get("/plot_balances/")
-def plot_balances():
-    p = plotters.pie_chart_balances(plaid_app.balances)
-    return json.dumps(json_item(p))
+def plot_balances(request: Request, ws: Workspace = Depends(workspace)):
+    plaid_app = ws.plaid_app
+    balances = plaid_app.balances
+    key = ("plot_balances", plaid_app.data_version)
+    return cached_chart(
+        ws, request, key, lambda plotters: plotters.pie_chart_balances(balances)
+    )
 
 
 @APP.get("/plot_budget/")
-def plot_budget():
-    p = plotters.bar_graph_budget(plaid_app.transactions, budget.budget)
-    return json.dumps(json_item(p))
+def plot_budget(
+    request: Request,
+    month: str = Query(..., regex=MONTH),
+    year: str = Query(..., regex=YEAR),
+    ws: Workspace = Depends(workspace),
+):
+    plaid_app = ws.plaid_app
+    key = (
+        "plot_budget",
+        int(month),
+        int(year),
+        plaid_app.transactions_version,
+        ws.budget_version,
+    )
+    totals = plaid_app.category_totals(month, year)
+    return cached_chart(
+        ws,
+        request,
+        key,
+        lambda plotters: plotters.bar_graph_budget(totals, ws.budget.budget),
+    )
 
 
 @APP.get("/plot_transactions_in/")
-def plot_transactions_in():
-    p = plotters.pie_chart_transactions_in(plaid_app.transactions, plaid_app.categories)
-    return json.dumps(json_item(p))
+def plot_transactions_in(
+    request: Request,
+    month: str = Query(..., regex=MONTH),
+    year: str = Query(..., regex=YEAR),
+    ws: Workspace = Depends(workspace),
+):
+    plaid_app = ws.plaid_app
+    key = (
+        "plot_transactions_in",
+        int(month),
+        int(year),
+        plaid_app.transactions_version,
+    )
+    totals = plaid_app.category_totals(month, year)
+    return cached_chart(
+        ws,
+        request,
+        key,
+        lambda plotters: plotters.pie_chart_transactions_in(
+            totals, plaid_app.categories
+        ),
+    )
 
 
 @APP.get("/plot_transactions_out/")
-def plot_transactions_out():
-    p = plotters.pie_chart_transactions_out(
-        plaid_app.transactions, plaid_app.categories
+def plot_transactions_out(
+    request: Request,
+    month: str = Query(..., regex=MONTH),
+    year: str = Query(..., regex=YEAR),
+    ws: Workspace = Depends(workspace),
+):
+    plaid_app = ws.plaid_app
+    key = (
+        "plot_transactions_out",
+        int(month),
+        int(year),
+        plaid_app.transactions_version,
+    )
+    totals = plaid_app.category_totals(month, year)
+    return cached_chart(
+        ws,
+        request,
+        key,
+        lambda plotters: plotters.pie_chart_transactions_out(
+            totals, plaid_app.categories
+        ),
     )
-    return json.dumps(json_item(p))
 
 
 @APP.get("/balances/")
-def get_balances():
-    return plaid_app.balances.to_json(orient="records")
+def get_balances(ws: Workspace = Depends(workspace)):
+    return ws.plaid_app.balances.to_json(orient="records")
 
 
 @APP.get("/net_worth/")
-def get_net_worth():
-    return plaid_app.net_worth
+def get_net_worth(ws: Workspace = Depends(workspace)):
+    return ws.plaid_app.net_worth
+
+
+@APP.get("/net_worth/history/")
+def net_worth_history(
+    start: t.Optional[date] = None,
+    end: t.Optional[date] = None,
+    freq: t.Optional[str] = None,
+    ws: Workspace = Depends(workspace),
+):
+    if freq not in (None, "D", "W", "M"):
+        raise HTTPException(status_code=400, detail="freq must be D, W or M")
+    net_worth = ws.plaid_app.history.net_worth(start, end, freq)
+    return json.dumps(
+        [
+            {"date": x.strftime("%Y-%m-%d"), "net_worth": value}
+            for x, value in net_worth.items()
+        ]
+    )
+
 
+class PageParam(BaseModel):
+    # Without any of these, the whole period is returned as one JSON string
+    format: t.Optional[str] = None
+    columns: t.Optional[list[str]] = None
+    cursor: t.Optional[str] = None
+    limit: t.Optional[int] = None
+
+    def paged(self) -> bool:
+        return any(
+            x is not None for x in (self.format, self.columns, self.cursor, self.limit)
+        )
+
+
+class YearParam(PageParam):
+    # The frontend sends the month too, left blank; it's ignored
+    year: str = Field(..., regex=YEAR)
 
-class TransactionsParam(BaseModel):
-    month: str
-    year: str
+
+class TransactionsParam(YearParam):
+    month: str = Field(..., regex=MONTH)
 
 
 @APP.post("/transactions/")
-def get_transactions(param: TransactionsParam):
-    plaid_app.filter_transactions_by_month(param.month, param.year)
-    return plaid_app.transactions.to_json(orient="records")
+def get_transactions(param: TransactionsParam, ws: Workspace = Depends(workspace)):
+    if param.paged():
+        return transactions_page(ws, param, *month_bounds(param.month, param.year))
+    transactions = ws.plaid_app.transactions_for_month(param.month, param.year)
+    return transactions.to_json(orient="records")
 
 
 @APP.post("/yearly_transactions/")
-def yearly_transactions(param: TransactionsParam):
-    plaid_app.filter_transactions_by_year(param.year)
-    return plaid_app.yearly_transactions.to_json(orient="records")
+def yearly_transactions(param: YearParam, ws: Workspace = Depends(workspace)):
+    if param.paged():
+        return transactions_page(ws, param, *year_bounds(param.year))
+    transactions = ws.plaid_app.transactions_for_year(param.year)
+    return transactions.to_json(orient="records")
+
+
+class DateRangeParam(PageParam):
+    start: date
+    end: date
+
+
+@APP.post("/transactions/range/")
+def transactions_range(param: DateRangeParam, ws: Workspace = Depends(workspace)):
+    if param.paged():
+        return transactions_page(ws, param, param.start, param.end)
+    transactions = ws.plaid_app.transactions_between(param.start, param.end)
+    return transactions.to_json(orient="records")
+
+
+def transactions_page(
+    ws: Workspace, param: PageParam, start: date, end: date
+) -> Response:
+    # "json" returns one page as a plain JSON object, "ndjson" and "arrow"
+    # stream it. Either way only the requested page is ever serialized
+    if param.format not in (None, "json", "ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail="unknown format")
+    limit = min(param.limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+
+    # The version is read before the frame, so a refresh in between can only
+    # make the cursor stale, never point it into the wrong snapshot
+    version = ws.plaid_app.transactions_version
+    df, lo, hi = ws.plaid_app.transactions_range(start, end)
+    offset = 0
+    if param.cursor:
+        try:
+            offset = streaming.decode_cursor(param.cursor, version)
+        except streaming.StaleCursor:
+            raise HTTPException(status_code=409, detail="transactions changed")
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    columns = param.columns or list(df.columns)
+    missing = [x for x in columns if x not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"unknown columns {missing}")
+
+    page = df.iloc[lo + offset : min(hi, lo + offset + limit)][columns]
+    next_cursor = None
+    if lo + offset + len(page) < hi:
+        next_cursor = streaming.encode_cursor(version, offset + len(page))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    if param.format == "ndjson":
+        return StreamingResponse(
+            streaming.ndjson_chunks(page),
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+    if param.format == "arrow":
+        try:
+            chunks = streaming.arrow_chunks(page)
+        except pa.ArrowException as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return StreamingResponse(
+            chunks, media_type="application/vnd.apache.arrow.stream", headers=headers
+        )
+    return Response(
+        content=streaming.json_page(page, next_cursor),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def analytics_response(
+    ws: Workspace,
+    by: str,
+    transform: t.Callable[[pd.DataFrame], pd.DataFrame],
+    start: t.Optional[str],
+    end: t.Optional[str],
+) -> str:
+    if by not in ("category", "account"):
+        raise HTTPException(status_code=400, detail="by must be category or account")
+    try:
+        # Any date in a month selects the whole month
+        first = None if start is None else pd.Period(start, freq="M")
+        last = None if end is None else pd.Period(end, freq="M")
+    except ValueError:
+        raise HTTPException(status_code=422, detail="start and end must be dates")
+    # Transformed over the whole history first, so that windows at the start
+    # of the range still see the months before it
+    df = transform(ws.plaid_app.monthly_totals(by)).loc[first:last]
+    df = df.set_axis(df.index.strftime("%Y-%m")).rename_axis("month")
+    return df.reset_index().to_json(orient="records")
+
+
+@APP.get("/analytics/rolling/")
+def analytics_rolling(
+    by: str = "category",
+    window: int = Query(3, ge=1),
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+    ws: Workspace = Depends(workspace),
+):
+    return analytics_response(
+        ws, by, lambda x: analytics.rolling_average(x, window), start, end
+    )
+
+
+@APP.get("/analytics/mom/")
+def analytics_mom(
+    by: str = "category",
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+    ws: Workspace = Depends(workspace),
+):
+    return analytics_response(ws, by, analytics.month_over_month, start, end)
+
+
+@APP.get("/analytics/yoy/")
+def analytics_yoy(
+    by: str = "category",
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+    ws: Workspace = Depends(workspace),
+):
+    return analytics_response(ws, by, analytics.year_over_year, start, end)
 
 
 @APP.get("/check_existing_tokens/")
-def check_existing_tokens():
-    return json.dumps(plaid_app.check_existing_tokens())
+async def check_existing_tokens(ws: Workspace = Depends(workspace)):
+    return json.dumps(await ws.plaid_app.async_check_existing_tokens())
 
 
 class Item(BaseModel):
@@ -196,41 +569,76 @@ class Item(BaseModel):
 
 
 @APP.post("/create_link_token/")
-def create_link_token(item: t.Optional[Item] = None):
+async def create_link_token(
+    item: t.Optional[Item] = None, ws: Workspace = Depends(workspace)
+):
     # Create a link_token for the given user
     if item is not None:
-        request = plaid_api.LinkTokenCreateRequest(
+        request = dict(
             client_name="Personal Finance App",
-            country_codes=[CountryCode("US")],
+            country_codes=["US"],
             # redirect_uri="https://domainname.com/oauth-page.html",
             language="en",
-            # webhook="https://webhook.example.com",
-            user=LinkTokenCreateRequestUser(client_user_id="wilsonconley"),
+            user={"client_user_id": ws.user_id},
             access_token=item.token,
         )
     else:
-        request = plaid_api.LinkTokenCreateRequest(
-            products=[Products("auth")],
+        request = dict(
+            products=["auth"],
             client_name="Personal Finance App",
-            country_codes=[CountryCode("US")],
+            country_codes=["US"],
             # redirect_uri="https://domainname.com/oauth-page.html",
             language="en",
-            # webhook="https://webhook.example.com",
-            user=LinkTokenCreateRequestUser(client_user_id="wilsonconley"),
+            user={"client_user_id": ws.user_id},
         )
-    response = plaid_app.client.link_token_create(request)
-    response_ = response.to_dict()
-    return json.dumps(response_["link_token"])
+    if WEBHOOK_URL:
+        request["webhook"] = WEBHOOK_URL
+    response = await ws.plaid_app.async_client.link_token_create(request)
+    return json.dumps(response["link_token"])
 
 
 @APP.post("/exchange_public_token/")
-def exchange_public_token(item: Item):
-    request = plaid_api.ItemPublicTokenExchangeRequest(public_token=item.token)
-    response = plaid_app.client.item_public_token_exchange(request)
+async def exchange_public_token(item: Item, ws: Workspace = Depends(workspace)):
+    plaid_app = ws.plaid_app
+    response = await plaid_app.async_client.item_public_token_exchange(item.token)
     access_token = response["access_token"]
     print("retrieved access token: " + access_token)
-    plaid_app.add_token(access_token)
-    return json.dumps(response.to_dict())
+    await asyncio.to_thread(plaid_app.add_token, access_token, response["item_id"])
+    # Webhooks only name the item, so remember whose it is
+    await asyncio.to_thread(workspaces.register_item, response["item_id"], ws.user_id)
+    return json.dumps(response)
+
+
+@APP.post("/plaid/webhook/")
+async def plaid_webhook(request: Request):
+    body = await request.body()
+    if not await webhook_verifier.verify(
+        body, request.headers.get("plaid-verification")
+    ):
+        raise HTTPException(status_code=401, detail="invalid webhook signature")
+
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid webhook body")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="invalid webhook body")
+    if (
+        event.get("webhook_type") == "TRANSACTIONS"
+        and event.get("webhook_code") in REFRESH_WEBHOOK_CODES
+    ):
+        item_id = event.get("item_id")
+        if not isinstance(item_id, str):
+            raise HTTPException(status_code=400, detail="missing item_id")
+        # Only the item the event is about is refreshed, and bursts of events
+        # are collapsed into one refresh
+        async with workspaces.lease(workspaces.user_for_item(item_id)) as ws:
+            access_token = await ws.plaid_app.async_access_token_for_item(item_id)
+            if access_token is not None:
+                ws.scheduler.debounce(
+                    [access_token], WEBHOOK_DEBOUNCE, WEBHOOK_MAX_WAIT
+                )
+    return "success"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+"""Counters and timing histograms, rendered in the Prometheus text format.
+
+Off unless ``FINANCE_METRICS`` is set when the module is imported. Disabled,
+``inc`` and ``observe`` return immediately, ``timer`` hands back a shared
+no-op context manager and ``timed`` leaves functions undecorated.
+
+Timers also append to the current request's Server-Timing entries when
+``collect_timings`` was called for it. Tasks spawned during a request inherit
+its context, so the entries stop collecting once the request closes them.
+"""
+
+import contextvars
+import functools
+import os
+import typing as t
+from threading import Lock
+from time import perf_counter
+
+ENABLED = bool(os.environ.get("FINANCE_METRICS"))
+
+# Upper bounds, in seconds, of the histogram buckets
+BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+_lock = Lock()
+_counters: dict[tuple[str, Labels], float] = {}
+# [count per bucket..., +Inf count, sum]
+_histograms: dict[tuple[str, Labels], list[float]] = {}
+# (name, description, seconds)
+Timing = tuple[str, str, float]
+
+
+class Timings:
+    """Server-Timing entries of one request."""
+
+    entries: list[Timing]
+    closed: bool
+
+    def __init__(self) -> None:
+        self.entries = []
+        self.closed = False
+
+    def append(self, timing: Timing) -> None:
+        # Background tasks started by the request outlive it
+        if not self.closed:
+            self.entries.append(timing)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+_timings: contextvars.ContextVar[t.Optional[Timings]] = contextvars.ContextVar(
+    "timings", default=None
+)
+
+
+def inc(name: str, value: float = 1.0, **labels: str) -> None:
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0.0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(BUCKETS)] += 1
+        histogram[-1] += value
+
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, " ".join(labels.values()), value))
+
+
+class _Timer:
+    name: str
+    labels: dict[str, str]
+    start: float
+
+    def __init__(self, name: str, labels: dict[str, str]) -> None:
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        observe(self.name, perf_counter() - self.start, **self.labels)
+
+
+class _NullTimer:
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str, **labels: str) -> t.Union[_Timer, _NullTimer]:
+    """Context manager observing its duration in the ``name`` histogram."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+F = t.TypeVar("F", bound=t.Callable[..., t.Any])
+
+
+def timed(name: str, **labels: str) -> t.Callable[[F], F]:
+    """Decorator timing every call, labelled with the function's name."""
+
+    def decorate(fn: F) -> F:
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            with _Timer(name, {"function": fn.__name__, **labels}):
+                return fn(*args, **kwargs)
+
+        return t.cast(F, wrapper)
+
+    return decorate
+
+
+def collect_timings() -> Timings:
+    """Start collecting the timings of the current request (context).
+
+    The caller closes the returned entries once the request is done.
+    """
+    timings = Timings()
+    _timings.set(timings)
+    return timings
+
+
+def server_timing(timings: list[Timing]) -> str:
+    entries = []
+    for name, desc, value in timings:
+        desc = f';desc="{_escape(desc)}"' if desc else ""
+        entries.append(f"{name}{desc};dur={value * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    for name in sorted({x for x, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (x, labels), value in counters.items():
+            if x == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({x for x, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (x, labels), histogram in histograms.items():
+            if x != name:
+                continue
+            cumulative = 0.0
+            for bound, count in zip([*BUCKETS, "+Inf"], histogram):
+                cumulative += count
+                le = (("le", str(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(labels + le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
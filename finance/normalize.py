@@ -0,0 +1,82 @@
+import typing as t
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Low-cardinality string columns stored as categoricals
+CATEGORICAL_COLUMNS: list[str] = [
+    "account_id",
+    "iso_currency_code",
+    "payment_channel",
+    "transaction_type",
+    "personal_finance_category_primary",
+    "personal_finance_category_detailed",
+]
+DATE_COLUMNS: list[str] = ["date", "authorized_date"]
+NESTED_COLUMNS: list[str] = ["location", "payment_meta", "personal_finance_category"]
+
+# Columns every transactions frame has, even when there are no transactions
+REQUIRED_COLUMNS: dict[str, str] = {
+    "transaction_id": "object",
+    "account_id": "object",
+    "date": "datetime64[ns]",
+    "amount": "float64",
+    "name": "object",
+    "merchant_name": "object",
+    "category": "object",
+    "personal_finance_category_primary": "object",
+}
+
+
+def normalize_transactions(transactions: list[dict[str, t.Any]]) -> pd.DataFrame:
+    """Build a typed, flat transactions frame from Plaid transaction records.
+
+    Nested objects (``location``, ``payment_meta``,
+    ``personal_finance_category``) are flattened into ``<field>_<key>``
+    columns, one vectorized frame construction per nested field.
+    """
+    df = pd.DataFrame(transactions)
+    for col in NESTED_COLUMNS:
+        if col not in df.columns:
+            continue
+        nested = pd.DataFrame(
+            [x if isinstance(x, dict) else {} for x in df.pop(col)], index=df.index
+        ).add_prefix(f"{col}_")
+        df = pd.concat([df, nested], axis=1)
+    for col, dtype in REQUIRED_COLUMNS.items():
+        if col not in df.columns:
+            df[col] = pd.Series(dtype=dtype, index=df.index)
+
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    df["amount"] = df["amount"].astype("float64")
+    df["datestr"] = df["date"].dt.strftime("%Y-%m-%d")
+
+    df["personal_finance_category_primary"] = df[
+        "personal_finance_category_primary"
+    ].fillna("N/A")
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    return df
+
+
+def concat_transactions(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Stack normalized frames, keeping the categorical columns categorical."""
+    # Shallow copies, the frames may be snapshots readers still hold
+    frames = [x.copy(deep=False) for x in frames if len(x)] or frames[:1]
+    for col in CATEGORICAL_COLUMNS:
+        columns = [x[col] for x in frames if col in x.columns]
+        if columns and all(x.dtype == "category" for x in columns):
+            # The union of the categories, so that the codes are just stacked
+            categories = union_categoricals(columns).categories
+            for x in frames:
+                if col in x.columns:
+                    x[col] = x[col].cat.set_categories(categories)
+    df = pd.concat(frames, ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and df[col].dtype != "category":
+            df[col] = df[col].astype("category")
+    return df
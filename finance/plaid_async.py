@@ -0,0 +1,92 @@
+import typing as t
+
+import httpx
+from plaid.exceptions import ApiException
+
+import finance.metrics as metrics
+
+PLAID_VERSION = "2020-09-14"
+
+
+class AsyncPlaidClient:
+    """Non-blocking client for the Plaid endpoints used by the server.
+
+    Requests share one pooled ``httpx.AsyncClient``, so connections to the
+    Plaid host are kept alive between calls. Error responses are raised as the
+    SDK's ``ApiException`` (with the JSON error as ``body``), so callers handle
+    both clients the same way. ``item_label`` names the item of an access token
+    in request metrics.
+    """
+
+    client_id: str
+    secret: str
+    http: httpx.AsyncClient
+    item_label: t.Callable[[str], str]
+
+    def __init__(
+        self,
+        host: str,
+        client_id: str,
+        secret: str,
+        timeout: float = 30.0,
+        max_connections: int = 16,
+        item_label: t.Callable[[str], str] = lambda access_token: "unknown",
+    ) -> None:
+        self.client_id = client_id
+        self.secret = secret
+        self.item_label = item_label
+        self.http = httpx.AsyncClient(
+            base_url=host,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            headers={"Plaid-Version": PLAID_VERSION},
+        )
+
+    async def post(self, path: str, body: dict[str, t.Any]) -> dict[str, t.Any]:
+        token = body.get("access_token")
+        item = "none" if token is None else self.item_label(token)
+        with metrics.timer("plaid_request_seconds", endpoint=path, item=item):
+            response = await self.http.post(
+                path, json={"client_id": self.client_id, "secret": self.secret, **body}
+            )
+        if response.status_code >= 400:
+            exc = ApiException(
+                status=response.status_code, reason=response.reason_phrase
+            )
+            exc.body = response.text
+            raise exc
+        return response.json()
+
+    async def accounts_balance_get(self, access_token: str) -> dict[str, t.Any]:
+        return await self.post("/accounts/balance/get", {"access_token": access_token})
+
+    async def transactions_sync(
+        self, access_token: str, cursor: str = ""
+    ) -> dict[str, t.Any]:
+        body = {
+            "access_token": access_token,
+            "options": {"include_personal_finance_category": True},
+        }
+        if cursor:
+            body["cursor"] = cursor
+        return await self.post("/transactions/sync", body)
+
+    async def link_token_create(self, body: dict[str, t.Any]) -> dict[str, t.Any]:
+        return await self.post("/link/token/create", body)
+
+    async def item_public_token_exchange(self, public_token: str) -> dict[str, t.Any]:
+        return await self.post(
+            "/item/public_token/exchange", {"public_token": public_token}
+        )
+
+    async def item_get(self, access_token: str) -> dict[str, t.Any]:
+        return await self.post("/item/get", {"access_token": access_token})
+
+    async def webhook_verification_key_get(self, key_id: str) -> dict[str, t.Any]:
+        return await self.post("/webhook_verification_key/get", {"key_id": key_id})
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
@@ -1,22 +1,38 @@
+import asyncio
 import json
-import os
 import typing as t
-from datetime import datetime
+import uuid
+from calendar import monthrange
+from datetime import date
 from pathlib import Path
-from time import sleep
+from threading import RLock
 
+import httpx
+import numpy as np
 import pandas as pd
-import plaid
-from plaid.api import plaid_api
 from plaid.exceptions import ApiException
-from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.model.transactions_get_request_options import (
-    TransactionsGetRequestOptions,
-)
 
+import finance.metrics as metrics
 from finance.api_keys import get_plaid
-from finance.rules import Rules
+from finance.analytics import pivot_months
+from finance.cache import LRUCache, frame_metadata, load_frame, save_frame
+from finance.concurrency import async_call_with_retries, backoff, gather_bounded
+from finance.database import Database
+from finance.history import BalanceHistory
+from finance.normalize import concat_transactions, normalize_transactions
+from finance.plaid_async import AsyncPlaidClient
+from finance.rules import RuleEngine, Rules
+
+RETRYABLE_ERRORS = {
+    "PRODUCT_NOT_READY",
+    "RATE_LIMIT_EXCEEDED",
+    "INTERNAL_SERVER_ERROR",
+    "INSTITUTION_DOWN",
+    "INSTITUTION_NOT_RESPONDING",
+}
+
+# Returned by /transactions/sync when the item changed between two pages
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
 
 
 class PlaidManager:
@@ -24,16 +40,33 @@ class PlaidManager:
     client_id: str
     secret: str
     access_tokens: list[str]
-    api_client: plaid.ApiClient
-    client: plaid_api.PlaidApi
+    async_client: AsyncPlaidClient
     env: str
 
     # Data
-    balances: pd.DataFrame = pd.DataFrame({})
-    net_worth: float
-    transactions: pd.DataFrame
+    balances: pd.DataFrame = pd.DataFrame(
+        {"account_id": [], "balances": [], "name": [], "balances_str": [], "legend": []}
+    )
+    accounts: dict[str, list[dict]]
+    item_tokens: dict[str, str]
+    # Tokens whose item was looked up with /item/get
+    item_lookups: set[str]
+    net_worth: float = 0.0
+    history: BalanceHistory
     transactions_all: pd.DataFrame
-    yearly_transactions: pd.DataFrame
+    data_version: int = 0
+    # Changes with every new transactions snapshot, and is never reused, even
+    # after a restart, so cursors and caches of transactions key on it
+    transactions_version: str = ""
+    # Totals from the database, by transactions_version
+    totals_cache: LRUCache
+    # Held while transactions_all and its rule_index change, so a rule edit
+    # and a sync never compute from each other's half-applied state
+    categorize_lock: RLock
+    balances_cache = Path(__file__).parent / ".balances.arrow"
+    transactions_cache = Path(__file__).parent / ".transactions_all.arrow"
+    db_filename: t.Optional[Path] = None
+    db: Database
 
     # Helpers
     base_categories: list[str] = [
@@ -56,229 +89,545 @@ class PlaidManager:
     ]
     categories: list[str]
 
-    def __init__(self, env: str) -> None:
+    # Fetching
+    max_workers: int = 8
+    timeout: float = 30.0
+    retries: int = 4
+    retry_delay: float = 1.0
+    # Times a sync restarts from its first page before giving up on the item
+    sync_restarts: int = 3
+
+    def __init__(self, env: str, directory: t.Optional[Path] = None) -> None:
         client_id, secret, access_tokens = get_plaid(env)
-        configuration = plaid.Configuration(
-            host=env,
-            api_key={
-                "clientId": client_id,
-                "secret": secret,
-            },
-        )
-        api_client = plaid.ApiClient(configuration)
-        client = plaid_api.PlaidApi(api_client)
+        if directory is not None:
+            # A user's workspace: the same API keys, but its own items, rules
+            # and caches
+            self.balances_cache = directory / ".balances.arrow"
+            self.transactions_cache = directory / ".transactions_all.arrow"
+            self.db_filename = directory / ".finance.db"
+            access_tokens = []
+        # Items linked through the app are kept in the database
+        self.db = Database.shared(self.db_filename)
+        access_tokens = list(access_tokens)
+        access_tokens += [x for x in self.db.tokens(env) if x not in access_tokens]
 
         self.client_id = client_id
         self.secret = secret
         self.access_tokens = access_tokens
-        self.api_client = api_client
-        self.client = client
+        self.async_client = AsyncPlaidClient(
+            env, client_id, secret, timeout=self.timeout, item_label=self._item
+        )
         self.env = env
 
         self.categories = self.base_categories
 
-        self.transactions = pd.DataFrame()
+        self.categorize_lock = RLock()
+        self.transactions_all = normalize_transactions([])
+        self.totals_cache = LRUCache(maxsize=32)
+        self.accounts = {}
+        self.item_tokens = self.db.item_tokens()
+        self.item_lookups = set()
+        self.history = BalanceHistory(
+            None if directory is None else directory / ".balance_history"
+        )
 
-    def check_existing_tokens(self) -> list[str]:
-        bad_tokens = []
-        for token in self.access_tokens:
-            request = AccountsBalanceGetRequest(access_token=token)
-            try:
-                self.client.accounts_balance_get(request)
-            except ApiException:
-                bad_tokens.append(token)
-        return bad_tokens
-
-    def add_token(self, access_token: str) -> None:
-        self.access_tokens.append(access_token)
-        token_df = pd.DataFrame({"token": self.access_tokens, "env": self.env})
-        if os.path.exists(Path(__file__).parent / "api_keys/.access_tokens.csv"):
-            existing_df = pd.read_csv(
-                Path(__file__).parent / "api_keys/.access_tokens.csv"
-            )
-            token_df.merge(existing_df)
-            token_df = pd.concat(
-                [token_df, existing_df], ignore_index=True
-            ).drop_duplicates()
-        token_df.to_csv(
-            Path(__file__).parent / "api_keys/.access_tokens.csv", index=False
+    async def _acall(self, fn: t.Callable[[], t.Awaitable[t.Any]]) -> t.Any:
+        return await async_call_with_retries(
+            fn, _should_retry, retries=self.retries, base_delay=self.retry_delay
         )
 
-    def get_transactions(
+    async def async_check_existing_tokens(self) -> list[str]:
+        async def is_bad(token: str) -> bool:
+            try:
+                await self._acall(lambda: self.async_client.accounts_balance_get(token))
+            except ApiException:
+                return True
+            return False
+
+        bad = await gather_bounded(is_bad, self.access_tokens, self.max_workers)
+        return [token for token, x in zip(self.access_tokens, bad) if x]
+
+    def add_token(self, access_token: str, item_id: t.Optional[str] = None) -> None:
+        self.db.add_item(access_token, self.env, item_id)
+        if access_token not in self.access_tokens:
+            self.access_tokens.append(access_token)
+        if item_id is not None:
+            self.item_tokens[item_id] = access_token
+
+    def save_cache(self) -> None:
+        save_frame(self.balances, self.balances_cache)
+        # Tagged with the cursors it was synced to, so a cache left behind by
+        # a later sync (e.g. after a crash) is never loaded
+        with self.categorize_lock:
+            df = self.transactions_all
+            cursors = json.dumps(self.db.cursors(), sort_keys=True)
+        save_frame(df, self.transactions_cache, {"cursors": cursors})
+
+    def load_cache(self) -> bool:
+        balances = load_frame(self.balances_cache)
+        cursors = frame_metadata(self.transactions_cache).get("cursors")
+        if balances is None or cursors != json.dumps(self.db.cursors(), sort_keys=True):
+            return False
+        transactions_all = load_frame(self.transactions_cache)
+        if (
+            transactions_all is None
+            or len(transactions_all) != self.db.transaction_count()
+        ):
+            return False
+
+        self.balances = balances
+        self.net_worth = sum(self.balances["balances"])
+        with self.categorize_lock:
+            self.transactions_all = _sort_by_date(transactions_all)
+            # Rules may have been edited since the cache was written
+            self.apply_user_categories()
+        return True
+
+    def load_stored(self) -> None:
+        """Load the cache, or else the stored transactions, before a refresh."""
+        if not self.load_cache() and self.db.transaction_count():
+            self._load_transactions()
+
+    async def async_sync_transactions(
         self, access_tokens: t.Optional[list[str]] = None
     ) -> pd.DataFrame:
         if not access_tokens:
             access_tokens = self.access_tokens
 
-        transactions = []
-        for token in access_tokens:
-            request = TransactionsGetRequest(
-                access_token=token,
-                start_date=datetime.strptime("2015-01-01", "%Y-%m-%d").date(),
-                end_date=datetime.now().date(),
-                options=TransactionsGetRequestOptions(
-                    include_personal_finance_category=True
-                ),
-            )
-            retries = 3
-            response = None
-            for _ in range(0, retries):
-                try:
-                    response = self.client.transactions_get(request)
-                except ApiException as exc:
-                    print(f"ERROR LOADING TRANSACTIONS FOR {token}")
-                    http_response = json.loads(exc.body)
-                    if http_response["error_code"] == "PRODUCT_NOT_READY":
-                        print("retrying...")
-                        sleep(5)
-            if response is None:
-                print(f"failed to load transasctions for {token}")
-                continue
+        results = await self._async_fetch_sync(access_tokens)
+        await asyncio.to_thread(self._apply_sync_results, access_tokens, results)
 
-            transactions.extend(response["transactions"])
+        return self.transactions_all
 
-            # the transactions in the response are paginated, so make multiple calls while increasing the offset to
-            # retrieve all transactions
-            while len(transactions) < response["total_transactions"]:
-                options = TransactionsGetRequestOptions(
-                    include_personal_finance_category=True
-                )
-                options.offset = len(transactions)
+    async def async_refresh(self, access_tokens: t.Optional[list[str]] = None) -> None:
+        # Only the first refresh makes requests here, so metrics and logs are
+        # labelled by item from the start
+        await self.async_resolve_items()
 
-                request = TransactionsGetRequest(
-                    access_token=token,
-                    start_date=datetime.strptime("2015-01-01", "%Y-%m-%d").date(),
-                    end_date=datetime.now().date(),
-                    options=options,
-                )
-                response = self.client.transactions_get(request)
-                transactions.extend(response["transactions"])
+        # Keep the configured token order so merged results are deterministic
+        tokens = [
+            x for x in self.access_tokens if access_tokens is None or x in access_tokens
+        ]
+        # Balances of the other items are kept, unless they were never fetched
+        # (e.g. after a warm start from the cache)
+        others = [x for x in self.access_tokens if x not in tokens]
+        balance_tokens = (
+            tokens if all(x in self.accounts for x in others) else self.access_tokens
+        )
 
-        # Parse data into DataFrame
-        data = (
-            {key: [i[key] for i in transactions] for key in transactions[0].to_dict()}
-            if transactions
-            else {"date": [], "personal_finance_category": []}
+        # Download everything first, then swap the new balances and
+        # transactions in back to back
+        accounts, results = await asyncio.gather(
+            self._async_fetch_accounts(balance_tokens),
+            self._async_fetch_sync(tokens),
         )
-        self.transactions_all = pd.DataFrame(data)
 
-        # Additional formatting
-        self.transactions_all["datestr"] = [
-            x.strftime("%Y-%m-%d") for x in self.transactions_all["date"]
-        ]
-        self.transactions_all["personal_finance_category_primary"] = [
-            _get_primary_category(x)
-            for x in self.transactions_all["personal_finance_category"]
-        ]
+        def swap() -> None:
+            self._apply_sync_results(tokens, results)
+            self._set_accounts(accounts)
 
-        self.apply_user_categories()
+        await asyncio.to_thread(swap)
 
-        return self.transactions_all
+    async def async_access_token_for_item(self, item_id: str) -> t.Optional[str]:
+        if item_id not in self.item_tokens:
+            await self.async_resolve_items(retry=True)
+        return self.item_tokens.get(item_id)
 
-    def apply_user_categories(self) -> None:
-        for df in (self.transactions, self.transactions_all):
-            if len(df) == 0:
+    async def async_resolve_items(self, retry: bool = False) -> None:
+        """Look up the items of tokens linked before their ids were recorded.
+
+        Tokens whose lookup failed are only tried again with ``retry``.
+        """
+        unknown = [
+            x
+            for x in self.access_tokens
+            if x not in self.item_tokens.values()
+            and (retry or x not in self.item_lookups)
+        ]
+        self.item_lookups.update(unknown)
+
+        async def get_item_id(token: str) -> t.Optional[str]:
+            try:
+                response = await self._acall(lambda: self.async_client.item_get(token))
+            except (ApiException, httpx.HTTPError):
+                return None
+            return response["item"]["item_id"]
+
+        item_ids = await gather_bounded(get_item_id, unknown, self.max_workers)
+        for token, x in zip(unknown, item_ids):
+            if x is not None:
+                await asyncio.to_thread(self.add_token, token, x)
+
+    async def _async_fetch_sync(
+        self, access_tokens: list[str]
+    ) -> list[t.Optional[tuple]]:
+        cursors = await asyncio.to_thread(self.db.cursors)
+
+        async def sync(token: str) -> t.Optional[tuple]:
+            try:
+                with metrics.timer("plaid_item_sync_seconds", item=self._item(token)):
+                    result = await self._async_sync_token(token, cursors.get(token, ""))
+            except (ApiException, httpx.HTTPError):
+                result = None
+            if result is None:
+                print(f"failed to sync transactions for {self._item(token)}")
+                metrics.inc("plaid_sync_failures_total", item=self._item(token))
+            return result
+
+        return await gather_bounded(sync, access_tokens, self.max_workers)
+
+    def _item(self, access_token: str) -> str:
+        # Metrics are labelled by item id, access tokens are secrets
+        for item_id, token in self.item_tokens.items():
+            if token == access_token:
+                return item_id
+        return "unknown"
+
+    def _apply_sync_results(
+        self, access_tokens: list[str], results: list[t.Optional[tuple]]
+    ) -> None:
+        synced = [(x, result) for x, result in zip(access_tokens, results) if result]
+        for token, (added, modified, removed, _) in synced:
+            print(
+                f"synced {self._item(token)}: {len(added)} added, "
+                f"{len(modified)} modified, {len(removed)} removed"
+            )
+        records = [x for _, (added, modified, _, _) in synced for x in added + modified]
+        removed = {x for _, (_, _, removed, _) in synced for x in removed}
+
+        # Only the delta is normalized, categorized and stored, then merged
+        # into the frame, which is already sorted and categorized
+        new = normalize_transactions(records)
+        with self.categorize_lock:
+            engine = self.rules().engine()
+            rule_index = engine.match(new)
+            user_category, plot_category = self._labels(new, engine, rule_index)
+            start = 0
+            for token, (added, modified, removed_, cursor) in synced:
+                end = start + len(added) + len(modified)
+                self.db.apply_sync(
+                    token,
+                    cursor,
+                    records[start:end],
+                    removed_,
+                    plot_category[start:end].tolist(),
+                )
+                start = end
+
+            if not records and not removed:
+                return
+            df = self.transactions_all
+            if len(df) and "rule_index" not in df.columns:
+                # Never categorized, e.g. loaded by an older version
+                self._load_transactions()
+                return
+            new["rule_index"] = rule_index
+            new["user_category"] = user_category
+            new["plot_category"] = plot_category
+            replaced = removed.union(new["transaction_id"])
+            kept = df[~df["transaction_id"].isin(replaced)]
+            self._swap(_sort_by_date(concat_transactions([kept, new])))
+
+    async def _async_sync_token(
+        self, token: str, cursor: str
+    ) -> t.Optional[tuple[list[dict], list[dict], list[str], str]]:
+        start_cursor = cursor
+        added, modified, removed = [], [], []
+        restarts = 0
+        has_more = True
+        while has_more:
+            try:
+                response = await self._acall(
+                    lambda: self.async_client.transactions_sync(token, cursor)
+                )
+            except ApiException as exc:
+                if _error_code(exc) != MUTATION_DURING_PAGINATION:
+                    raise
+                # Data changed mid-pagination, restart from the first page
+                metrics.inc("plaid_sync_restarts_total", item=self._item(token))
+                if restarts == self.sync_restarts:
+                    return None
+                await asyncio.sleep(backoff(restarts, self.retry_delay))
+                restarts += 1
+                cursor = start_cursor
+                added, modified, removed = [], [], []
                 continue
 
-            # Apply custom rulesets for categorizing
-            user_categories = ["" for _ in range(0, len(df))]
-            for index, transaction in df.iterrows():
-                for _, rule in Rules().rules.iterrows():
-                    condition = f"""'{rule["search_str"]}' in transaction['{rule["transaction_field"]}']"""
-                    if eval(condition):
-                        user_categories[index] = rule["categorize"]
-            if "user_category" in df.columns:
-                df.loc[
-                    [True for _ in range(len(df))], "user_category"
-                ] = user_categories
-            else:
-                df.insert(len(df.columns), "user_category", user_categories)
-
-            # Choose category for plotting
-            plot_categories = []
-            for _, transaction in df.iterrows():
-                to_append = (
-                    transaction["user_category"]
-                    if transaction["user_category"]
-                    else transaction["personal_finance_category_primary"]
+            metrics.inc("plaid_pages_total", endpoint="transactions_sync")
+            added.extend(response["added"])
+            modified.extend(response["modified"])
+            removed.extend(x["transaction_id"] for x in response["removed"])
+            has_more = response["has_more"]
+            cursor = response["next_cursor"]
+        return added, modified, removed, cursor
+
+    def _set_transactions(self, transactions: list[dict]) -> None:
+        """Replace every stored transaction with ``transactions``."""
+        df = _sort_by_date(normalize_transactions(transactions))
+        with self.categorize_lock:
+            self.db.set_transactions(transactions)
+            self.transactions_all = df
+            self.apply_user_categories()
+
+    def _load_transactions(self) -> None:
+        records, categories = self.db.transactions()
+        df = normalize_transactions(records)
+        # As last stored, so that only categories that change are written back
+        df["plot_category"] = categories
+        with self.categorize_lock:
+            self.transactions_all = _sort_by_date(df)
+            self.apply_user_categories()
+
+    def apply_user_categories(self) -> None:
+        # Apply custom rulesets for categorizing
+        with self.categorize_lock, metrics.timer("categorize_seconds", mode="full"):
+            df = self.transactions_all
+            engine = self.rules().engine()
+            self._set_rule_index(df, engine, engine.match(df))
+
+    def rules(self) -> Rules:
+        return Rules.shared(self.db_filename)
+
+    def add_rule(
+        self, search_str: str, transaction_field: str, categorize: str
+    ) -> None:
+        with self.categorize_lock:
+            rules = self.rules()
+            version = rules.version
+            rules.add_rule(search_str, transaction_field, categorize)
+            engine = rules.engine()
+            df = self.transactions_all
+            if engine.version == version:
+                # Rule already in ruleset
+                return
+            if engine.version != version + 1 or "rule_index" not in df.columns:
+                # Another edit interleaved, fall back to a full pass
+                self.apply_user_categories()
+                return
+
+            # The new rule is last, so it wins every row it matches and no others
+            with metrics.timer("categorize_seconds", mode="add_rule"):
+                position = len(engine.rules) - 1
+                matched = RuleEngine(engine.rules.iloc[[position]]).match(df) >= 0
+                rule_index = df["rule_index"].to_numpy(copy=True)
+                rule_index[matched] = position
+                self._set_rule_index(df, engine, rule_index)
+
+    def remove_rule(self, index: int) -> None:
+        with self.categorize_lock:
+            rules = self.rules()
+            version = rules.version
+            rules.remove_rule(index)
+            engine = rules.engine()
+            df = self.transactions_all
+            if engine.version != version + 1 or "rule_index" not in df.columns:
+                self.apply_user_categories()
+                return
+
+            # Only the rows the removed rule had won need matching again, later
+            # rules just shift down one position
+            with metrics.timer("categorize_seconds", mode="remove_rule"):
+                rule_index = df["rule_index"].to_numpy(copy=True)
+                affected = rule_index == index
+                rule_index[rule_index > index] -= 1
+                if affected.any():
+                    rule_index[affected] = engine.match(df[affected])
+                self._set_rule_index(df, engine, rule_index)
+
+    def _labels(
+        self, df: pd.DataFrame, engine: RuleEngine, rule_index: np.ndarray
+    ) -> tuple[pd.Series, pd.Series]:
+        user_category = engine.labels(rule_index, df.index)
+
+        # Choose category for plotting
+        plot_category = user_category.where(
+            user_category != "", df["personal_finance_category_primary"]
+        )
+        return user_category, plot_category
+
+    def _set_rule_index(
+        self,
+        df: pd.DataFrame,
+        engine: RuleEngine,
+        rule_index: np.ndarray,
+    ) -> None:
+        user_category, plot_category = self._labels(df, engine, rule_index)
+
+        # Stored first, so that totals cached under the new version can't come
+        # from the old categories. Only the rows that changed are written
+        changed = np.ones(len(df), dtype=bool)
+        if "plot_category" in df.columns:
+            changed = (plot_category != df["plot_category"]).to_numpy()
+        if changed.any():
+            with metrics.timer("db_write_seconds", table="transactions"):
+                self.db.set_categories(
+                    df["transaction_id"][changed].tolist(),
+                    plot_category[changed].tolist(),
                 )
-                plot_categories.append(to_append)
-            if "plot_category" in df.columns:
-                df.loc[
-                    [True for _ in range(len(df))], "plot_category"
-                ] = plot_categories
-            else:
-                df.insert(len(df.columns), "plot_category", plot_categories)
-
-            self.categories = self.base_categories + list(
-                set([x for x in plot_categories if x not in self.base_categories])
-            )
 
-            # Exclude "exclude" or "disable" categories from plot
-            to_remove = [
-                x
-                for x in self.categories
-                if x.lower() == "exclude" or x.lower() == "disable"
-            ]
-            for x in to_remove:
-                self.categories.remove(x)
-
-    def filter_transactions_by_month(self, month: str, year: str) -> None:
-        selector = [
-            str(x)[0:4] == year and int(str(x)[5:7]) == int(month)
-            for x in self.transactions_all["date"]
-        ]
-        self.transactions = self.transactions_all[selector]
-        self.transactions.index = range(len(self.transactions))
+        # Swap in a new frame (sharing the untouched columns), so that readers
+        # holding the previous snapshot never see it half-categorized
+        df = df.copy(deep=False)
+        df["rule_index"] = rule_index
+        df["user_category"] = user_category
+        df["plot_category"] = plot_category
+        self._swap(df)
+
+    def _swap(self, df: pd.DataFrame) -> None:
+        # `df` is categorized, and its categories already stored
+        categories = self.base_categories + sorted(
+            set(df["plot_category"].unique()) - set(self.base_categories)
+        )
 
-    def filter_transactions_by_year(self, year: str) -> None:
-        selector = [str(x)[0:4] == year for x in self.transactions_all["date"]]
-        self.yearly_transactions = self.transactions_all[selector]
-        self.yearly_transactions.index = range(len(self.yearly_transactions))
+        # Exclude "exclude" or "disable" categories from plot
+        categories = [
+            x for x in categories if x.lower() != "exclude" and x.lower() != "disable"
+        ]
 
-    def get_balances(self, access_tokens: t.Optional[list[str]] = None) -> pd.DataFrame:
+        self.transactions_all = df
+        self.categories = categories
+        self.transactions_version = uuid.uuid4().hex
+        self.data_version += 1
+
+    def transactions_for_month(self, month: str, year: str) -> pd.DataFrame:
+        return self.transactions_between(*month_bounds(month, year))
+
+    def transactions_for_year(self, year: str) -> pd.DataFrame:
+        return self.transactions_between(*year_bounds(year))
+
+    def category_totals(self, month: str, year: str) -> pd.Series:
+        # Shared by every chart of the same period until the data changes
+        key = (self.transactions_version, int(month), int(year))
+        totals = self.totals_cache.get(key)
+        if totals is None:
+            start, end = month_bounds(month, year)
+            totals = self.db.category_totals(start.isoformat(), end.isoformat())
+            self.totals_cache.put(key, totals)
+        return totals
+
+    def monthly_totals(self, by: str = "category") -> pd.DataFrame:
+        column = "account_id" if by == "account" else "plot_category"
+        key = (self.transactions_version, column)
+        totals = self.totals_cache.get(key)
+        if totals is None:
+            totals = pivot_months(self.db.monthly_totals(column), column)
+            self.totals_cache.put(key, totals)
+        if by == "account":
+            return totals
+        return totals[[x for x in self.categories if x in totals.columns]]
+
+    def transactions_between(self, start: date, end: date) -> pd.DataFrame:
+        df, lo, hi = self.transactions_range(start, end)
+        return df.iloc[lo:hi].reset_index(drop=True)
+
+    def transactions_range(
+        self, start: date, end: date
+    ) -> tuple[pd.DataFrame, int, int]:
+        # transactions_all is sorted by date, so the inclusive range is a
+        # contiguous slice found by binary search. The frame is returned too,
+        # since the positions are only valid for this snapshot
+        df = self.transactions_all
+        dates = df["date"].values
+        lo = np.searchsorted(dates, np.datetime64(start, "ns"), side="left")
+        hi = np.searchsorted(dates, np.datetime64(end, "ns"), side="right")
+        return df, int(lo), int(hi)
+
+    async def async_get_balances(
+        self, access_tokens: t.Optional[list[str]] = None
+    ) -> pd.DataFrame:
         if not access_tokens:
             access_tokens = self.access_tokens
 
-        accounts = []
-        for token in access_tokens:
-            # Pull real-time balance information for each account associated with the Item
-            request = AccountsBalanceGetRequest(access_token=token)
-            response = self.client.accounts_balance_get(request)
-            accounts.extend(response["accounts"])
+        accounts = await self._async_fetch_accounts(access_tokens)
+        return await asyncio.to_thread(self._set_accounts, accounts)
+
+    async def _async_fetch_accounts(
+        self, access_tokens: list[str]
+    ) -> dict[str, list[dict]]:
+        async def get_accounts(token: str) -> list:
+            response = await self._acall(
+                lambda: self.async_client.accounts_balance_get(token)
+            )
+            return response["accounts"]
+
+        accounts = await gather_bounded(get_accounts, access_tokens, self.max_workers)
+        return dict(zip(access_tokens, accounts))
 
+    def _set_accounts(self, accounts: dict[str, list[dict]]) -> pd.DataFrame:
+        self.accounts = {**self.accounts, **accounts}
+        return self._set_balances(
+            [x for token in self.access_tokens for x in self.accounts.get(token, [])]
+        )
+
+    def _set_balances(self, accounts_: list[dict]) -> pd.DataFrame:
         # Parse data into DataFrame
-        accounts_ = [account.to_dict() for account in accounts]
-        for account in accounts_:
-            account["balances"] = account["balances"]["available"]
-        data = (
-            {key: [i[key] for i in accounts_] for key in accounts_[0]}
+        accounts_ = [
+            {**account, "balances": account["balances"]["available"]}
+            for account in accounts_
+        ]
+        balances = (
+            pd.DataFrame(accounts_)
             if accounts_
-            else {"account_id": [], "balances": [], "name": []}
+            else pd.DataFrame({"account_id": [], "balances": [], "name": []})
         )
-        self.balances = pd.DataFrame(data)
 
         # Additional formatting
-        self.balances["balances_str"] = [f"${x:.2f}" for x in self.balances["balances"]]
-        # self.balances["legend"] = [
+        balances["balances_str"] = [f"${x:.2f}" for x in balances["balances"]]
+        # balances["legend"] = [
         #     f"{name} ({id[0:4]})"
-        #     for id, name in zip(self.balances["account_id"], self.balances["name"])
+        #     for id, name in zip(balances["account_id"], balances["name"])
         # ]
-        self.balances["legend"] = [
+        balances["legend"] = [
             f"{name} - {official_name}"
             for official_name, name in zip(
-                self.balances["official_name"], self.balances["name"]
+                balances.get("official_name", balances["name"]), balances["name"]
             )
         ]
 
         # Calculate net worth
-        self.net_worth = sum(self.balances["balances"])
+        self.balances = balances
+        self.net_worth = sum(balances["balances"])
+        self.history.append(balances)
+        self.data_version += 1
 
         return self.balances
 
 
-def _get_primary_category(category: dict[str, str]) -> str:
-    if category is not None and "primary" in category:
-        return category["primary"]
-    else:
-        return "N/A"
+def month_bounds(month: str, year: str) -> tuple[date, date]:
+    start = date(int(year), int(month), 1)
+    end = date(int(year), int(month), monthrange(int(year), int(month))[1])
+    return start, end
+
+
+def year_bounds(year: str) -> tuple[date, date]:
+    return date(int(year), 1, 1), date(int(year), 12, 31)
+
+
+def _sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    if df["date"].is_monotonic_increasing:
+        return df
+    return df.sort_values("date", kind="stable", ignore_index=True)
+
+
+def _error_code(exc: ApiException) -> t.Optional[str]:
+    try:
+        return json.loads(exc.body)["error_code"]
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
+def _should_retry(exc: Exception) -> bool:
+    retry = _is_retryable(exc)
+    if retry:
+        metrics.inc("plaid_retries_total", error=type(exc).__name__)
+    return retry
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, ApiException):
+        error_code = _error_code(exc)
+        if error_code is None:
+            return exc.status is not None and exc.status >= 500
+        return error_code in RETRYABLE_ERRORS
+    # Timeouts and dropped connections
+    return isinstance(exc, httpx.TransportError)
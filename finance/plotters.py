@@ -2,16 +2,17 @@ import copy
 import typing as t
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from bokeh.io import export_svg
 from bokeh.models import ColumnDataSource, DataTable, LabelSet, TableColumn, FactorRange
 from bokeh.palettes import Category20c
 from bokeh.plotting import figure, output_file, save, show, Figure
 from bokeh.transform import cumsum, factor_cmap, dodge
 
+import finance.metrics as metrics
 
+
+@metrics.timed("chart_build_seconds")
 def table_balances(balances_df: pd.DataFrame) -> Figure:
     columns = [
         TableColumn(field="legend", title="Name", width=600),
@@ -37,6 +38,7 @@ def bokeh_data_table(
     return p
 
 
+@metrics.timed("chart_build_seconds")
 def pie_chart_balances(balances_df: pd.DataFrame) -> Figure:
     p = bokeh_pie_chart(
         balances_df,
@@ -50,7 +52,8 @@ def pie_chart_balances(balances_df: pd.DataFrame) -> Figure:
     return p
 
 
-def bar_graph_budget(transaction_df: pd.DataFrame, budget: dict[str, float]) -> Figure:
+@metrics.timed("chart_build_seconds")
+def bar_graph_budget(totals: pd.Series, budget: dict[str, float]) -> Figure:
     # Set params
     height = 400
     width = 700
@@ -64,10 +67,9 @@ def bar_graph_budget(transaction_df: pd.DataFrame, budget: dict[str, float]) ->
     # Get Transactions
     categories = budget.keys()
     transaction_dict = {"category": [], "total": []}
-    if len(transaction_df) > 0:
+    if len(totals) > 0:
         for category in categories:
-            selector = [x == category for x in transaction_df["plot_category"]]
-            total = abs(sum(transaction_df["amount"][selector]))
+            total = abs(totals.get(category, 0.0))
             # if total > 0:
             #     # Only include non-zero and non-negative transactions
             #     transaction_dict["category"].append(category)
@@ -79,7 +81,7 @@ def bar_graph_budget(transaction_df: pd.DataFrame, budget: dict[str, float]) ->
 
     # Format data
     data = {"categories": [], "budget": [], "transactions": []}
-    if len(transaction_df) > 0:
+    if len(totals) > 0:
         for x in categories:
             b = budget[x]
             idx = transaction_dict["category"].index(x)
@@ -129,15 +131,13 @@ TRANSACTION_WIDTH = 700
 TRANSACTION_HEIGHT = 500
 
 
-def pie_chart_transactions_out(
-    transaction_df: pd.DataFrame, categories: list[str]
-) -> Figure:
+@metrics.timed("chart_build_seconds")
+def pie_chart_transactions_out(totals: pd.Series, categories: list[str]) -> Figure:
     # Transactions Out
     transaction_dict = {"category": [], "total": []}
-    if len(transaction_df) > 0:
+    if len(totals) > 0:
         for category in categories:
-            selector = [x == category for x in transaction_df["plot_category"]]
-            total = sum(transaction_df["amount"][selector])
+            total = totals.get(category, 0.0)
             if total > 0:
                 # Only include non-zero and non-negative transactions
                 transaction_dict["category"].append(category)
@@ -156,15 +156,13 @@ def pie_chart_transactions_out(
     return p
 
 
-def pie_chart_transactions_in(
-    transaction_df: pd.DataFrame, categories: list[str]
-) -> Figure:
+@metrics.timed("chart_build_seconds")
+def pie_chart_transactions_in(totals: pd.Series, categories: list[str]) -> Figure:
     # Transactions In
     transaction_dict = {"category": [], "total": []}
-    if len(transaction_df) > 0:
+    if len(totals) > 0:
         for category in categories:
-            selector = [x == category for x in transaction_df["plot_category"]]
-            total = sum(transaction_df["amount"][selector])
+            total = totals.get(category, 0.0)
             if total < 0:
                 # Only include negative transactions
                 transaction_dict["category"].append(category)
@@ -229,10 +227,7 @@ def bokeh_pie_chart(
 
     # Add labels to each wedge
     value = df[angle_col].values
-    df["cum_angle"] = [
-        (sum(value[0 : i + 1]) - (item / 2)) / sum(value) * 2.0 * np.pi
-        for i, item in enumerate(value)
-    ]
+    df["cum_angle"] = (np.cumsum(value) - value / 2) / value.sum() * 2.0 * np.pi
     df["cos"] = np.cos(df["cum_angle"]) * 0.25
     df["sin"] = np.sin(df["cum_angle"]) * 0.5
     source = ColumnDataSource(df)
@@ -254,7 +249,9 @@ def bokeh_pie_chart(
     p.background_fill_color = None
     p.border_fill_color = None
 
-    # # Save svg
+    # # Save svg (export_svg pulls in selenium, import it here when needed)
+    # from bokeh.io import export_svg
+    #
     # p.output_backend = "svg"
     # output_file(Path(__file__).parent / f"../frontend/src/assets/{filename}.html")
     # export_svg(
@@ -1,55 +1,214 @@
-import os
+import typing as t
 from pathlib import Path
+from threading import Lock
 
+import ahocorasick
+import numpy as np
 import pandas as pd
 
+import finance.metrics as metrics
+from finance.database import Database
+from finance.normalize import NESTED_COLUMNS
+
 
 class Rules:
+    """Categorization rules, persisted to the database's ``rules`` table.
+
+    Use ``Rules.shared()`` to get the process-wide instance, which loads the
+    table once and then serves reads from memory. Every change is written
+    through to disk and bumps ``version``, which downstream caches key on.
+    """
 
     rule_columns: list[str] = ["search_str", "transaction_field", "categorize"]
-    filename = Path(__file__).parent / ".rules.csv"
+    filename = Database.filename
+    db: Database
     rules: pd.DataFrame
+    # Row ids of the rules, in order
+    ids: list[int]
+    version: int
+    lock: Lock
+    _engine: t.Optional["RuleEngine"]
+
+    _shared: dict[Path, "Rules"] = {}
+    _shared_lock = Lock()
+
+    def __init__(self, filename: t.Optional[Path] = None) -> None:
+        if filename is not None:
+            self.filename = filename
+        self.version = 0
+        self.lock = Lock()
+        self._engine = None
+        self.db = Database.shared(self.filename)
+        rules = self.db.rules()
+        self.ids = rules.pop("id").tolist()
+        self.rules = rules
 
-    def __init__(self) -> None:
-        if os.path.exists(self.filename):
-            self.rules = pd.read_csv(self.filename)
-        else:
-            self.rules = pd.DataFrame({k: [] for k in self.rule_columns})
-            self.save_rules()
+    @classmethod
+    def shared(cls, filename: t.Optional[Path] = None) -> "Rules":
+        filename = Path(filename or cls.filename)
+        with cls._shared_lock:
+            if filename not in cls._shared:
+                cls._shared[filename] = cls(filename)
+            return cls._shared[filename]
+
+    @classmethod
+    def release(cls, filename: t.Optional[Path] = None) -> None:
+        """Drop the shared instance for ``filename``; it is reloaded on next use."""
+        with cls._shared_lock:
+            cls._shared.pop(Path(filename or cls.filename), None)
 
     def save_rules(self) -> None:
-        self.rules.to_csv(self.filename, index=False)
+        self.ids = self.db.set_rules(self.rules)
+
+    def engine(self) -> "RuleEngine":
+        # Compiled once per version of the ruleset
+        with self.lock:
+            if self._engine is None or self._engine.version != self.version:
+                with metrics.timer("rules_compile_seconds"):
+                    self._engine = RuleEngine(self.rules, self.version)
+            return self._engine
 
     def add_rule(
         self, search_str: str, transaction_field: str, categorize: str
     ) -> None:
         # Example:
         #   self.add_rule("'HOME TELE' in transaction['name']", "Utilities")
-        if (
-            (self.rules["search_str"] == search_str)
-            & (self.rules["transaction_field"] == transaction_field)
-            & (self.rules["categorize"] == categorize)
-        ).any():
-            # Rule already in ruleset
-            return
-
-        self.rules = pd.concat(
-            [
-                self.rules,
-                pd.DataFrame(
-                    {
-                        "search_str": search_str,
-                        "transaction_field": transaction_field,
-                        "categorize": categorize,
-                    },
-                    index=[0],
-                ),
-            ],
-            ignore_index=True,
-        )
-        self.save_rules()
+        with self.lock:
+            if (
+                (self.rules["search_str"] == search_str)
+                & (self.rules["transaction_field"] == transaction_field)
+                & (self.rules["categorize"] == categorize)
+            ).any():
+                # Rule already in ruleset
+                return
+
+            rule = pd.DataFrame(
+                {
+                    "search_str": search_str,
+                    "transaction_field": transaction_field,
+                    "categorize": categorize,
+                },
+                index=[0],
+            )
+            # New rules go at the end, so persisting is a single insert
+            self.ids.append(self.db.add_rule(search_str, transaction_field, categorize))
+            self.rules = pd.concat([self.rules, rule], ignore_index=True)
+            self.version += 1
 
     def remove_rule(self, index: int) -> None:
-        self.rules.drop(index, inplace=True)
-        self.rules.index = range(len(self.rules))
-        self.save_rules()
+        with self.lock:
+            rules = self.rules.drop(index).reset_index(drop=True)
+            self.db.remove_rule(self.ids.pop(index))
+            self.rules = rules
+            self.version += 1
+
+
+class RuleEngine:
+    """Ruleset compiled into one Aho-Corasick automaton per field.
+
+    Matching follows the original semantics: a rule matches a transaction when
+    its ``search_str`` is a substring of the transaction's ``transaction_field``
+    and, when several rules match, the last one in the ruleset wins. Rules on a
+    nested object (e.g. ``location``) search all of its flattened columns. Each
+    distinct field value is scanned once, whatever the number of rules; every
+    occurrence of every pattern is reported, and the highest rule position
+    among them wins.
+    """
+
+    rules: pd.DataFrame
+    version: int
+    fields: dict[str, "_FieldMatcher"]
+
+    def __init__(self, rules: pd.DataFrame, version: int = 0) -> None:
+        self.rules = rules.reset_index(drop=True)
+        self.version = version
+        patterns: dict[str, dict[str, int]] = {}
+        for position, (search_str, field) in enumerate(
+            zip(self.rules["search_str"], self.rules["transaction_field"])
+        ):
+            # Later rules overwrite earlier ones with the same pattern
+            patterns.setdefault(field, {})[str(search_str)] = position
+        self.fields = {k: _FieldMatcher(v) for k, v in patterns.items()}
+
+    def match(self, df: pd.DataFrame) -> np.ndarray:
+        # Position of the winning (last matching) rule for each row, -1 if none
+        winners = np.full(len(df), -1, dtype=np.int64)
+        if len(df) == 0:
+            return winners
+        for field, matcher in self.fields.items():
+            for column in _columns(df, field):
+                # Merchant names and descriptions repeat heavily, so each
+                # distinct value is matched once and broadcast back to the rows
+                codes, uniques = pd.factorize(_hashable(df[column]))
+                if len(uniques) == 0:
+                    continue
+                unique_winners = np.fromiter(
+                    (matcher.best(x) for x in uniques),
+                    dtype=np.int64,
+                    count=len(uniques),
+                )
+                row_winners = np.where(codes >= 0, unique_winners[codes], -1)
+                np.maximum(winners, row_winners, out=winners)
+        return winners
+
+    def categorize(self, df: pd.DataFrame) -> pd.Series:
+        return self.labels(self.match(df), df.index)
+
+    def labels(self, winners: np.ndarray, index: pd.Index) -> pd.Series:
+        # Category of each row's winning rule, "" where no rule matched
+        user_categories = pd.Series("", index=index, dtype=object)
+        matched = winners >= 0
+        if matched.any():
+            categorize = self.rules["categorize"].astype(str).to_numpy(dtype=object)
+            user_categories[matched] = categorize[winners[matched]]
+        return user_categories
+
+
+def _columns(df: pd.DataFrame, field: str) -> list[str]:
+    if field in df.columns:
+        return [field]
+    if field in NESTED_COLUMNS:
+        # Nested objects are flattened into "<field>_<key>" columns, a rule on
+        # the object matches any of them
+        return [x for x in df.columns if x.startswith(f"{field}_")]
+    return []
+
+
+def _hashable(column: pd.Series) -> pd.Series:
+    if column.dtype != object:
+        return column
+    is_list = column.map(lambda x: isinstance(x, (list, np.ndarray)))
+    if not is_list.any():
+        return column
+    return column.where(~is_list, column[is_list].map(tuple))
+
+
+class _FieldMatcher:
+    """Highest rule position whose pattern occurs in a value."""
+
+    automaton: ahocorasick.Automaton
+    exact: dict[str, int]
+    # Position of the last empty pattern, which every string contains
+    empty: int
+
+    def __init__(self, patterns: dict[str, int]) -> None:
+        self.exact = patterns
+        self.empty = patterns.get("", -1)
+        self.automaton = ahocorasick.Automaton()
+        for pattern, position in patterns.items():
+            if pattern:
+                self.automaton.add_word(pattern, position)
+        if len(self.automaton):
+            self.automaton.make_automaton()
+
+    def best(self, value: t.Any) -> int:
+        if isinstance(value, str):
+            if not len(self.automaton):
+                return self.empty
+            # The empty pattern matches too, whatever else does
+            matches = (x for _, x in self.automaton.iter(value))
+            return max(self.empty, max(matches, default=-1))
+        if isinstance(value, tuple):
+            # List fields (e.g. "category") match on membership
+            return max((self.exact.get(x, -1) for x in value), default=-1)
+        return -1
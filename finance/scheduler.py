@@ -0,0 +1,172 @@
+import asyncio
+import itertools
+import math
+import time
+import typing as t
+
+
+class RefreshJob:
+    """One refresh of some (or all, when ``access_tokens`` is None) items."""
+
+    id: int
+    access_tokens: t.Optional[set[str]]
+    status: str
+    created: float
+    started: t.Optional[float]
+    finished: t.Optional[float]
+    error: t.Optional[str]
+    done: asyncio.Event
+
+    def __init__(self, id: int, access_tokens: t.Optional[list[str]]) -> None:
+        self.id = id
+        self.access_tokens = None if access_tokens is None else set(access_tokens)
+        self.status = "pending"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.done = asyncio.Event()
+
+    def merge(self, access_tokens: t.Optional[list[str]]) -> None:
+        if self.access_tokens is None or access_tokens is None:
+            self.access_tokens = None
+        else:
+            self.access_tokens.update(access_tokens)
+
+    async def wait(self) -> "RefreshJob":
+        await self.done.wait()
+        return self
+
+    def to_dict(self) -> dict[str, t.Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "access_tokens": (
+                None if self.access_tokens is None else sorted(self.access_tokens)
+            ),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+class RefreshScheduler:
+    """Runs refreshes in the background, one at a time.
+
+    Triggers that arrive while a job is waiting are merged into it, and
+    triggers that arrive while a job runs are merged into a single follow-up
+    job, so a burst of triggers costs at most one extra refresh. ``debounce``
+    additionally waits for a quiet period, up to a maximum, before triggering. Items are also
+    refreshed periodically, each on its own interval.
+    """
+
+    refresh: t.Callable[[t.Optional[list[str]]], t.Awaitable[None]]
+    access_tokens: t.Callable[[], list[str]]
+    interval: float
+    item_intervals: dict[str, float]
+    jobs: dict[int, RefreshJob]
+    last_refreshed: dict[str, float]
+    max_jobs: int = 100
+
+    def __init__(
+        self,
+        refresh: t.Callable[[t.Optional[list[str]]], t.Awaitable[None]],
+        access_tokens: t.Callable[[], list[str]],
+        interval: float = 6 * 60 * 60,
+        item_intervals: t.Optional[dict[str, float]] = None,
+    ) -> None:
+        self.refresh = refresh
+        self.access_tokens = access_tokens
+        self.interval = interval
+        self.item_intervals = item_intervals or {}
+        self.jobs = {}
+        self.last_refreshed = {}
+        self._ids = itertools.count(1)
+        self._pending: t.Optional[RefreshJob] = None
+        self._worker: t.Optional[asyncio.Task] = None
+        self._timer: t.Optional[asyncio.Task] = None
+        self._debounced: set[str] = set()
+        self._debounce_started = 0.0
+        self._debounce_timer: t.Optional[asyncio.Task] = None
+
+    def trigger(self, access_tokens: t.Optional[list[str]] = None) -> RefreshJob:
+        if self._pending is not None:
+            self._pending.merge(access_tokens)
+            return self._pending
+
+        job = RefreshJob(next(self._ids), access_tokens)
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            self.jobs.pop(next(iter(self.jobs)))
+        self._pending = job
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        return job
+
+    def debounce(
+        self, access_tokens: list[str], delay: float, max_wait: float = math.inf
+    ) -> None:
+        # Trailing debounce: trigger once no new request arrived for `delay`,
+        # or `max_wait` after the first one, so a steady stream still refreshes
+        now = time.monotonic()
+        if not self._debounced:
+            self._debounce_started = now
+        self._debounced.update(access_tokens)
+        if self._debounce_timer is not None:
+            self._debounce_timer.cancel()
+        delay = min(delay, self._debounce_started + max_wait - now)
+        self._debounce_timer = asyncio.create_task(self._fire_debounced(delay))
+
+    async def _fire_debounced(self, delay: float) -> None:
+        await asyncio.sleep(max(delay, 0.0))
+        tokens, self._debounced = sorted(self._debounced), set()
+        self.trigger(tokens)
+
+    def busy(self) -> bool:
+        """Whether a refresh is running, queued or waiting on a debounce."""
+        running = self._worker is not None and not self._worker.done()
+        return running or self._pending is not None or bool(self._debounced)
+
+    def latest(self) -> t.Optional[RefreshJob]:
+        return self.jobs[max(self.jobs)] if self.jobs else None
+
+    def start(self, tick: float = 60.0) -> None:
+        self._timer = asyncio.create_task(self._periodic(tick))
+
+    async def stop(self) -> None:
+        for task in (self._timer, self._worker, self._debounce_timer):
+            if task is not None:
+                task.cancel()
+
+    async def _work(self) -> None:
+        while self._pending is not None:
+            job, self._pending = self._pending, None
+            job.status = "running"
+            job.started = time.time()
+            tokens = None if job.access_tokens is None else sorted(job.access_tokens)
+            try:
+                await self.refresh(tokens)
+            except Exception as exc:
+                job.status = "failed"
+                job.error = repr(exc)
+            else:
+                job.status = "succeeded"
+                for token in tokens or self.access_tokens():
+                    self.last_refreshed[token] = job.started
+            finally:
+                job.finished = time.time()
+                job.done.set()
+
+    async def _periodic(self, tick: float) -> None:
+        while True:
+            await asyncio.sleep(tick)
+            now = time.time()
+            due = [
+                token
+                for token in self.access_tokens()
+                if now - self.last_refreshed.get(token, 0.0)
+                >= self.item_intervals.get(token, self.interval)
+            ]
+            if due:
+                self.trigger(due)
@@ -12,13 +12,17 @@ from finance.api_keys import get_smartsheet
 
 os.environ["SMARTSHEET_ACCESS_TOKEN"] = get_smartsheet()
 
+# Rows per add/update request, Smartsheet's recommended maximum
+MAX_ROWS_PER_REQUEST = 500
+
 
 class SmartsheetManager:
     client: smartsheet.Smartsheet
     sheets: list[smartsheet.models.sheet.Sheet] = []
+    batch_size: int = MAX_ROWS_PER_REQUEST
 
-    def __init__(self) -> None:
-        self.client = smartsheet.Smartsheet()
+    def __init__(self, client: t.Optional[smartsheet.Smartsheet] = None) -> None:
+        self.client = client if client is not None else smartsheet.Smartsheet()
 
     def get_sheets(self) -> list[smartsheet.models.sheet.Sheet]:
         response = self.client.Sheets.list_sheets(include_all=True)
@@ -89,46 +93,115 @@ class SmartsheetManager:
     def add_rows(
         self, sheet_id: int, data: dict[str, list[t.Any]], check_col: str
     ) -> None:
+        self.upsert_rows(sheet_id, data, check_col)
+
+    def index_sheet(self, sheet_id: int, check_col: str) -> "SheetIndex":
+        return SheetIndex(self.client.Sheets.get_sheet(sheet_id), check_col)
+
+    def upsert_rows(
+        self,
+        sheet_id: int,
+        data: dict[str, list[t.Any]],
+        check_col: str,
+        index: t.Optional["SheetIndex"] = None,
+    ) -> tuple[int, int]:
+        """Add rows whose ``check_col`` value is new and update changed ones.
+
+        The sheet is downloaded once and indexed by ``check_col``, unless an
+        ``index`` from an earlier call is passed (and kept current), unchanged
+        rows are skipped, and the rest is sent in batches of ``batch_size``.
+        Returns the number of rows added and updated.
+        """
+        num_rows = len(data[check_col])
+        if any(len(x) != num_rows for x in data.values()):
+            raise ValueError("all cols must have same number of data points")
+
+        if index is None:
+            index = self.index_sheet(sheet_id, check_col)
         new_data = {}
-        num_rows = 0
         for col in data:
-            col_id = self.get_col_id(sheet_id, col)
+            col_id = index.col_ids.get(col.lower())
             if not col_id:
                 col_id = self.add_col(sheet_id, col)
+                index.col_ids[col.lower()] = col_id
             if col == check_col:
                 check_id = col_id
-            new_data[col_id] = data[col]
-            if num_rows == 0:
-                num_rows = len(data[col])
-            elif num_rows != len(data[col]):
-                raise ValueError("all cols must have same number of data points")
-
-        row_add = []
-        row_update = []
-        for i in range(0, num_rows):
-            row_id = self.check_row(sheet_id, data[check_col][i], check_id)
-            row = smartsheet.models.Row()
-            for col_id in new_data:
-                value = new_data[col_id][i]
-                if value is None:
-                    value = ""
-                elif not issubclass(type(value), (int, float, str)):
-                    if issubclass(type(value), date):
-                        value = value.strftime("%Y/%m/%d - %H:%M:%S")
-                    elif issubclass(type(value), (Location, PaymentMeta)):
-                        value = json.dumps(value.to_dict())
-                    else:
-                        value = json.dumps(value)
-                row.cells.append({"column_id": col_id, "value": value})
-            if row_id:
+            new_data[col_id] = [_cell_value(x) for x in data[col]]
+
+        # Keyed by the check value, so repeated keys collapse to the last one
+        existing = index.rows
+        row_add = {}
+        row_update = {}
+        for i in range(num_rows):
+            key = new_data[check_id][i]
+            cells = {col_id: values[i] for col_id, values in new_data.items()}
+            if key in existing:
+                row_id, values = existing[key]
+                if all(_same_value(values.get(x), y) for x, y in cells.items()):
+                    row_update.pop(key, None)
+                    continue
+                row = smartsheet.models.Row()
                 row.id = row_id
-                row_update.append(row)
+                row_update[key] = row
+                existing[key] = (row_id, {**values, **cells})
             else:
+                row = smartsheet.models.Row()
                 row.to_top = True
-                row_add.append(row)
+                row_add[key] = row
+            for col_id, value in cells.items():
+                row.cells.append({"column_id": col_id, "value": value})
 
         # Add rows to sheet
-        if row_add:
-            self.client.Sheets.add_rows(sheet_id, row_add)
-        if row_update:
-            self.client.Sheets.update_rows(sheet_id, row_update)
+        row_add, row_update = list(row_add.values()), list(row_update.values())
+        for i in range(0, len(row_add), self.batch_size):
+            response = self.client.Sheets.add_rows(
+                sheet_id, row_add[i : i + self.batch_size]
+            )
+            # The new rows' ids, so later upserts with this index update them
+            index.add(response.result)
+        for i in range(0, len(row_update), self.batch_size):
+            self.client.Sheets.update_rows(
+                sheet_id, row_update[i : i + self.batch_size]
+            )
+        return len(row_add), len(row_update)
+
+
+class SheetIndex:
+    """Column ids of a sheet by title, and its rows by ``check_col`` value."""
+
+    check_col: str
+    col_ids: dict[str, int]
+    # Row id and cell values by column id
+    rows: dict[t.Any, tuple[int, dict[int, t.Any]]]
+
+    def __init__(self, sheet: smartsheet.models.sheet.Sheet, check_col: str) -> None:
+        self.check_col = check_col
+        self.col_ids = {col.title.lower(): col.id for col in sheet.columns}
+        self.rows = {}
+        self.add(sheet.rows)
+
+    def add(self, rows: list[smartsheet.models.Row]) -> None:
+        check_id = self.col_ids.get(self.check_col.lower())
+        for row in rows:
+            values = {cell.column_id: cell.value for cell in row.cells}
+            if values.get(check_id) is not None:
+                self.rows[values[check_id]] = (row.id, values)
+
+
+def _cell_value(value: t.Any) -> t.Any:
+    if value is None:
+        return ""
+    if issubclass(type(value), (int, float, str)):
+        return value
+    if issubclass(type(value), date):
+        return value.strftime("%Y/%m/%d - %H:%M:%S")
+    if issubclass(type(value), (Location, PaymentMeta)):
+        return json.dumps(value.to_dict())
+    return json.dumps(value)
+
+
+def _same_value(current: t.Any, value: t.Any) -> bool:
+    # Smartsheet returns empty cells as None and whole numbers as floats
+    if current is None:
+        return value == ""
+    return current == value or str(current) == str(value)
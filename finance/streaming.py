@@ -0,0 +1,74 @@
+import base64
+import io
+import json
+import typing as t
+
+import pandas as pd
+import pyarrow as pa
+
+# Rows per chunk written to a streamed response
+CHUNK_SIZE = 1000
+
+
+class StaleCursor(ValueError):
+    """The transactions changed since the cursor was handed out."""
+
+
+def encode_cursor(version: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{version}:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: str, version: str) -> int:
+    """Offset stored in ``cursor``, which must belong to snapshot ``version``."""
+    try:
+        decoded = base64.urlsafe_b64decode(cursor).decode()
+        cursor_version, offset = decoded.rsplit(":", 1)
+        offset = int(offset)
+    except ValueError:
+        raise ValueError(f"malformed cursor {cursor!r}")
+    if cursor_version != version or offset < 0:
+        raise StaleCursor(cursor)
+    return offset
+
+
+def json_page(df: pd.DataFrame, next_cursor: t.Optional[str]) -> bytes:
+    # Records are spliced in as already-encoded JSON instead of being parsed
+    # and encoded again
+    records = df.to_json(orient="records")
+    return (
+        f'{{"transactions":{records},"next_cursor":{json.dumps(next_cursor)}}}'
+    ).encode()
+
+
+def ndjson_chunks(df: pd.DataFrame) -> t.Iterator[bytes]:
+    for start in range(0, len(df), CHUNK_SIZE):
+        chunk = df.iloc[start : start + CHUNK_SIZE]
+        # Older pandas leave the last line unterminated, newer ones don't
+        lines = chunk.to_json(orient="records", lines=True).rstrip("\n")
+        yield f"{lines}\n".encode()
+
+
+def arrow_chunks(df: pd.DataFrame) -> t.Iterator[bytes]:
+    """``df`` as an Arrow IPC stream, one record batch per chunk.
+
+    The conversion happens up front so that unsupported columns raise
+    ``pa.ArrowException`` here rather than halfway through the response.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def chunks() -> t.Iterator[bytes]:
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=CHUNK_SIZE):
+                writer.write_batch(batch)
+                yield _drain(sink)
+        yield _drain(sink)
+
+    return chunks()
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -0,0 +1,118 @@
+import hashlib
+import hmac
+import json
+import math
+import time
+import typing as t
+
+import jwt
+from jwt.algorithms import ECAlgorithm
+
+# TRANSACTIONS webhook codes that mean new or changed data for the item
+REFRESH_WEBHOOK_CODES: set[str] = {
+    "SYNC_UPDATES_AVAILABLE",
+    "DEFAULT_UPDATE",
+    "INITIAL_UPDATE",
+    "HISTORICAL_UPDATE",
+    "TRANSACTIONS_REMOVED",
+}
+
+
+class WebhookVerifier:
+    """Checks the ``Plaid-Verification`` JWT sent with every Plaid webhook.
+
+    The JWT must be ES256-signed by a current Plaid key, be at most
+    ``max_age`` seconds old, and carry the SHA-256 of the exact request body.
+    Keys are fetched by key id through ``fetch_key`` and cached for
+    ``key_ttl`` seconds, then fetched again to see whether they expired. Key
+    ids that could not be fetched are not tried again for ``unknown_ttl``
+    seconds, and a key id is fetched at most every ``fetch_interval``
+    seconds, so forged key ids can't make every request call Plaid. The limit
+    is per key id, so that a flood of forged ones can't hold back the first
+    fetch of a key Plaid just rotated in.
+    """
+
+    fetch_key: t.Callable[[str], t.Awaitable[dict[str, t.Any]]]
+    keys: dict[str, dict[str, t.Any]]
+    # Monotonic time each key was fetched, of failed fetches by key id, and
+    # of the last fetch attempted for each key id
+    fetched: dict[str, float]
+    unknown: dict[str, float]
+    attempted: dict[str, float]
+    max_age: int = 5 * 60
+    key_ttl: float = 60 * 60
+    unknown_ttl: float = 10 * 60
+    fetch_interval: float = 1.0
+    max_unknown: int = 1000
+
+    def __init__(
+        self, fetch_key: t.Callable[[str], t.Awaitable[dict[str, t.Any]]]
+    ) -> None:
+        self.fetch_key = fetch_key
+        self.keys = {}
+        self.fetched = {}
+        self.unknown = {}
+        self.attempted = {}
+
+    def add_key(self, key_id: str, jwk: dict[str, t.Any]) -> None:
+        self.keys[key_id] = jwk
+        self.fetched[key_id] = time.monotonic()
+
+    async def get_key(self, key_id: str) -> t.Optional[dict[str, t.Any]]:
+        now = time.monotonic()
+        jwk = self.keys.get(key_id)
+        if jwk is not None and now - self.fetched[key_id] < self.key_ttl:
+            return jwk
+        if now - self.unknown.get(key_id, -math.inf) < self.unknown_ttl:
+            return None
+        if now - self.attempted.get(key_id, -math.inf) < self.fetch_interval:
+            # A stale key is still better than none until the next fetch
+            return jwk
+
+        _remember(self.attempted, key_id, now, self.max_unknown)
+        try:
+            fresh = await self.fetch_key(key_id)
+        except Exception:
+            if jwk is not None:
+                # Plaid being unreachable doesn't revoke a key it issued
+                return jwk
+            _remember(self.unknown, key_id, now, self.max_unknown)
+            return None
+        self.add_key(key_id, fresh)
+        return fresh
+
+    async def verify(self, body: bytes, token: t.Optional[str]) -> bool:
+        if not token:
+            return False
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.PyJWTError:
+            return False
+        if header.get("alg") != "ES256" or "kid" not in header:
+            return False
+
+        jwk = await self.get_key(str(header["kid"]))
+        if jwk is None or jwk.get("expired_at") is not None:
+            return False
+
+        try:
+            claims = jwt.decode(
+                token,
+                key=ECAlgorithm.from_jwk(json.dumps(jwk)),
+                algorithms=["ES256"],
+            )
+        except (jwt.PyJWTError, ValueError):
+            return False
+        if time.time() - claims.get("iat", 0) > self.max_age:
+            return False
+        return hmac.compare_digest(
+            hashlib.sha256(body).hexdigest(), str(claims.get("request_body_sha256"))
+        )
+
+
+def _remember(times: dict[str, float], key_id: str, now: float, limit: int) -> None:
+    # Oldest entries first, so the dict can be bounded by dropping from the front
+    times.pop(key_id, None)
+    times[key_id] = now
+    while len(times) > limit:
+        times.pop(next(iter(times)))
@@ -0,0 +1,216 @@
+import asyncio
+import contextlib
+import os
+import re
+import typing as t
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+
+from finance.budget import Budget
+from finance.cache import LRUCache
+from finance.database import Database
+from finance.plaid_manager import PlaidManager
+from finance.rules import Rules
+from finance.scheduler import RefreshScheduler
+
+# Served from the original single-user files, so existing data keeps working
+DEFAULT_USER = "wilsonconley"
+USER_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Workspaces kept in memory at once
+MAX_USERS = int(os.environ.get("FINANCE_MAX_USERS", 8))
+
+
+class Workspace:
+    """One user's Plaid items, transactions, rules, budget and charts."""
+
+    user_id: str
+    directory: t.Optional[Path]
+    plaid_app: PlaidManager
+    budget: Budget
+    budget_version: int = 0
+    chart_cache: LRUCache
+    scheduler: RefreshScheduler
+    on_refresh: t.Optional[t.Callable[["Workspace"], None]]
+    # Requests currently using this workspace
+    leases: int = 0
+
+    def __init__(
+        self,
+        user_id: str,
+        env: str,
+        directory: t.Optional[Path] = None,
+        on_refresh: t.Optional[t.Callable[["Workspace"], None]] = None,
+    ) -> None:
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.user_id = user_id
+        self.directory = directory
+        self.plaid_app = PlaidManager(env, directory)
+        self.chart_cache = LRUCache(maxsize=64)
+        self.scheduler = RefreshScheduler(
+            self.refresh, lambda: self.plaid_app.access_tokens
+        )
+        self.on_refresh = on_refresh
+
+    async def open(self) -> None:
+        # Serve what is on disk right away and refresh it in the background
+        await asyncio.to_thread(self.plaid_app.load_stored)
+        await asyncio.to_thread(self.load_budget)
+        self.scheduler.trigger()
+        self.scheduler.start()
+
+    @property
+    def idle(self) -> bool:
+        return self.leases == 0 and not self.scheduler.busy()
+
+    async def close(self) -> None:
+        await self.scheduler.stop()
+        await asyncio.to_thread(self.plaid_app.save_cache)
+        await self.plaid_app.async_client.aclose()
+        Rules.release(self.plaid_app.db_filename)
+        Database.release(self.plaid_app.db_filename)
+
+    async def refresh(self, access_tokens: t.Optional[list[str]] = None) -> None:
+        # Update balances and transactions
+        await self.plaid_app.async_refresh(access_tokens)
+
+        await asyncio.to_thread(self.plaid_app.save_cache)
+
+        await asyncio.to_thread(self.load_budget)
+
+        if self.on_refresh is not None:
+            self.on_refresh(self)
+
+    def load_budget(self) -> None:
+        self.budget = Budget(self.plaid_app.categories, self.plaid_app.db_filename)
+        self.budget_changed()
+
+    def budget_changed(self) -> None:
+        self.budget_version += 1
+        self.chart_cache.clear()
+
+
+class Workspaces:
+    """Loaded workspaces, bounded to ``max_users``.
+
+    A user's workspace is loaded from disk on first use, and requests hold it
+    through ``lease``. Past the limit, the least recently used idle ones (no
+    leases, no refresh running or queued) are saved and dropped; everything
+    they hold is already on disk, so they are simply loaded again on their
+    next request. The default user's workspace is never dropped. Busy
+    workspaces can keep the count above the limit until a later lease ends.
+    """
+
+    env: str
+    root: Path = Path(__file__).parent / ".users"
+    max_users: int
+    loaded: "OrderedDict[str, Workspace]"
+    item_users: dict[str, str]
+    on_refresh: t.Optional[t.Callable[[Workspace], None]]
+
+    def __init__(
+        self,
+        env: str,
+        max_users: int = MAX_USERS,
+        on_refresh: t.Optional[t.Callable[[Workspace], None]] = None,
+    ) -> None:
+        self.env = env
+        self.max_users = max(max_users, 1)
+        self.on_refresh = on_refresh
+        self.loaded = OrderedDict()
+        self._loading: dict[str, asyncio.Task] = {}
+        self._closing: dict[str, asyncio.Task] = {}
+        self.item_users = {}
+        if os.path.exists(self.items_filename):
+            item_df = pd.read_csv(self.items_filename, dtype=str)
+            self.item_users = dict(zip(item_df["item_id"], item_df["user_id"]))
+
+    @property
+    def items_filename(self) -> Path:
+        return self.root / ".item_users.csv"
+
+    def directory(self, user_id: str) -> t.Optional[Path]:
+        return None if user_id == DEFAULT_USER else self.root / user_id
+
+    @contextlib.asynccontextmanager
+    async def lease(self, user_id: str) -> t.AsyncIterator[Workspace]:
+        workspace = await self.acquire(user_id)
+        try:
+            yield workspace
+        finally:
+            await self.release(workspace)
+
+    async def acquire(self, user_id: str) -> Workspace:
+        if not USER_ID.fullmatch(user_id):
+            raise ValueError(f"invalid user id {user_id!r}")
+        while True:
+            workspace = self.loaded.get(user_id)
+            if workspace is not None:
+                self.loaded.move_to_end(user_id)
+                workspace.leases += 1
+                # Only once leased, so a new workspace isn't the one evicted
+                await self._evict()
+                return workspace
+
+            # Concurrent requests for a user that isn't loaded share one load.
+            # It may be evicted again before this resumes, so look it up again
+            task = self._loading.get(user_id)
+            if task is None:
+                task = asyncio.create_task(self._load(user_id))
+                self._loading[user_id] = task
+                task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+            await asyncio.shield(task)
+
+    async def release(self, workspace: Workspace) -> None:
+        workspace.leases -= 1
+        await self._evict()
+
+    async def _load(self, user_id: str) -> Workspace:
+        closing = self._closing.get(user_id)
+        if closing is not None:
+            # An evicted copy still holds the user's shared database and rules
+            await asyncio.shield(closing)
+        workspace = await asyncio.to_thread(
+            Workspace, user_id, self.env, self.directory(user_id), self.on_refresh
+        )
+        await workspace.open()
+        self.loaded[user_id] = workspace
+        return workspace
+
+    async def _evict(self) -> None:
+        evicted = []
+        for x in list(self.loaded.values()):
+            if len(self.loaded) <= self.max_users:
+                break
+            if x.user_id != DEFAULT_USER and x.idle:
+                evicted.append(self.loaded.pop(x.user_id))
+        for x in evicted:
+            print(f"evicting workspace {x.user_id}")
+            task = asyncio.create_task(x.close())
+            self._closing[x.user_id] = task
+            task.add_done_callback(
+                lambda _, user_id=x.user_id: self._closing.pop(user_id, None)
+            )
+            await asyncio.shield(task)
+
+    async def close(self) -> None:
+        while self.loaded:
+            await self.loaded.popitem(last=False)[1].close()
+
+    def user_for_item(self, item_id: str) -> str:
+        return self.item_users.get(item_id, DEFAULT_USER)
+
+    def register_item(self, item_id: str, user_id: str) -> None:
+        self.item_users[item_id] = user_id
+        item_df = pd.DataFrame(
+            {
+                "item_id": list(self.item_users),
+                "user_id": list(self.item_users.values()),
+            }
+        )
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.items_filename.with_name(self.items_filename.name + ".tmp")
+        item_df.to_csv(tmp, index=False)
+        os.replace(tmp, self.items_filename)
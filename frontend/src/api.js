@@ -0,0 +1,33 @@
+const API_URL = "http://127.0.0.1:8000";
+
+/** API token of this browser's user, asked for once and kept in localStorage.
+Tokens are issued with `python scripts/add_user.py <user id>`.
+**/
+function api_token(reset = false) {
+  if (reset) {
+    localStorage.removeItem("api_token");
+  }
+  let token = localStorage.getItem("api_token");
+  if (!token) {
+    token = window.prompt("API token") || "";
+    localStorage.setItem("api_token", token);
+  }
+  return token;
+}
+
+/** fetch() against the backend, authenticated with the user's API token.
+`path` starts with a slash, e.g. "/balances/".
+**/
+export async function api(path, options = {}) {
+  const request = (token) =>
+    fetch(`${API_URL}${path}`, {
+      ...options,
+      headers: { ...options.headers, Authorization: `Bearer ${token}` },
+    });
+  const response = await request(api_token());
+  if (response.status == 401) {
+    // Unknown or revoked token, ask again
+    return await request(api_token(true));
+  }
+  return response;
+}
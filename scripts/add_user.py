@@ -0,0 +1,17 @@
+"""Issue an API token for a user of the app.
+
+Prints a new token for the given user id; the frontend asks for it once and
+sends it with every request. Earlier tokens of the user stay valid. The
+default user's id is finance.workspace.DEFAULT_USER.
+
+Usage: python scripts/add_user.py <user id>
+"""
+
+import sys
+
+from finance.auth import ApiTokens
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__.strip().splitlines()[-1])
+    print(ApiTokens().issue(sys.argv[1]))
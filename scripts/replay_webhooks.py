@@ -0,0 +1,152 @@
+"""Replay signed Plaid webhooks against the local app, without Plaid.
+
+Signs canned events with a throwaway P-256 key (registered with the app's
+verifier), posts them to /plaid/webhook/ in-process and prints which items
+were refreshed, and for which user. The refresh itself is replaced by a
+print, so no Plaid credentials are needed.
+
+Usage: python scripts/replay_webhooks.py [events.json]
+
+The optional file holds a list of webhook bodies; by default a burst of
+updates for two items and one forged request are replayed.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+from jwt.algorithms import ECAlgorithm
+
+import finance.main as main
+from finance.scheduler import RefreshScheduler
+from finance.webhooks import WebhookVerifier
+from finance.workspace import DEFAULT_USER
+
+KEY_ID = "replay-key"
+DEBOUNCE = 0.2
+
+EVENTS = [
+    {
+        "webhook_type": "TRANSACTIONS",
+        "webhook_code": "SYNC_UPDATES_AVAILABLE",
+        "item_id": "item-a",
+    },
+    {
+        "webhook_type": "TRANSACTIONS",
+        "webhook_code": "DEFAULT_UPDATE",
+        "item_id": "item-a",
+    },
+    {
+        "webhook_type": "TRANSACTIONS",
+        "webhook_code": "SYNC_UPDATES_AVAILABLE",
+        "item_id": "item-b",
+    },
+    {"webhook_type": "ITEM", "webhook_code": "ERROR", "item_id": "item-b"},
+]
+
+
+class ReplayManager:
+    def __init__(self, item_tokens: dict[str, str]) -> None:
+        self.item_tokens = item_tokens
+        self.access_tokens = list(item_tokens.values())
+
+    async def async_access_token_for_item(self, item_id):
+        return self.item_tokens.get(item_id)
+
+
+class ReplayWorkspaces:
+    # item-a belongs to the default user, item-b to a second one
+    item_users = {"item-b": "guest"}
+
+    def __init__(self, refresh) -> None:
+        self.loaded = {}
+        for user_id, item_tokens in [
+            (DEFAULT_USER, {"item-a": "access-a"}),
+            ("guest", {"item-b": "access-b"}),
+        ]:
+            plaid_app = ReplayManager(item_tokens)
+            scheduler = RefreshScheduler(
+                lambda tokens, user_id=user_id: refresh(user_id, tokens),
+                lambda plaid_app=plaid_app: plaid_app.access_tokens,
+            )
+            self.loaded[user_id] = SimpleNamespace(
+                user_id=user_id, plaid_app=plaid_app, scheduler=scheduler
+            )
+
+    def user_for_item(self, item_id: str) -> str:
+        return self.item_users.get(item_id, DEFAULT_USER)
+
+    @contextlib.asynccontextmanager
+    async def lease(self, user_id: str):
+        yield self.loaded[user_id]
+
+
+def sign(key: ec.EllipticCurvePrivateKey, body: bytes) -> str:
+    claims = {
+        "iat": int(time.time()),
+        "request_body_sha256": hashlib.sha256(body).hexdigest(),
+    }
+    return jwt.encode(claims, key, algorithm="ES256", headers={"kid": KEY_ID})
+
+
+async def no_fetch(key_id: str) -> dict:
+    raise KeyError(key_id)
+
+
+async def replay(events: list[dict]) -> None:
+    refreshed = []
+
+    async def refresh(user_id, access_tokens):
+        print(f"refresh {user_id} {access_tokens}")
+        refreshed.append(access_tokens)
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    main.workspaces = ReplayWorkspaces(refresh)
+    main.webhook_verifier = WebhookVerifier(no_fetch)
+    main.webhook_verifier.add_key(
+        KEY_ID, json.loads(ECAlgorithm.to_jwk(key.public_key()))
+    )
+    main.WEBHOOK_DEBOUNCE = DEBOUNCE
+
+    # Served in this event loop, without running the app's startup hook
+    transport = httpx.ASGITransport(app=main.APP)
+    async with httpx.AsyncClient(transport=transport, base_url="http://r") as client:
+        for event in events:
+            body = json.dumps(event).encode()
+            response = await client.post(
+                "/plaid/webhook/",
+                content=body,
+                headers={"Plaid-Verification": sign(key, body)},
+            )
+            print(f"{event['webhook_code']} {event['item_id']}: {response.status_code}")
+
+        # Forged: signed for a different body
+        body = json.dumps(events[0]).encode()
+        response = await client.post(
+            "/plaid/webhook/",
+            content=body,
+            headers={"Plaid-Verification": sign(key, body + b" ")},
+        )
+        print(f"forged: {response.status_code}")
+
+    await asyncio.sleep(DEBOUNCE * 2)
+    for ws in main.workspaces.loaded.values():
+        job = ws.scheduler.latest()
+        if job is not None:
+            await job.wait()
+    print(f"{len(refreshed)} refresh(es) for {len(events)} event(s)")
+
+
+if __name__ == "__main__":
+    events = EVENTS
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            events = json.load(f)
+    asyncio.run(replay(events))
@@ -0,0 +1,40 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+API_KEYS = Path(__file__).parents[1] / "finance" / "api_keys"
+
+# The real keystore holds secrets and is never committed; the sample one has
+# the same interface and is enough for code that never reaches Plaid
+if not (API_KEYS / "keystore.py").exists():
+    spec = importlib.util.spec_from_file_location(
+        "finance.api_keys.keystore", API_KEYS / "sample_keystore.py"
+    )
+    keystore = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(keystore)
+    sys.modules["finance.api_keys.keystore"] = keystore
+
+
+@pytest.fixture
+def fake_plaid():
+    from fake_plaid import FakePlaid
+
+    with FakePlaid() as fake:
+        yield fake
+
+
+@pytest.fixture
+def manager(fake_plaid, tmp_path, monkeypatch):
+    """A PlaidManager on its own directory, talking to ``fake_plaid``."""
+    import finance.plaid_manager as plaid_manager
+    from finance.database import Database
+    from finance.rules import Rules
+
+    monkeypatch.setattr(plaid_manager, "get_plaid", lambda env: ("id", "secret", []))
+    manager = plaid_manager.PlaidManager(fake_plaid.url, tmp_path)
+    manager.retry_delay = 0.0
+    yield manager
+    Rules.release(manager.db_filename)
+    Database.release(manager.db_filename)
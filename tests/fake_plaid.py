@@ -0,0 +1,210 @@
+import json
+import threading
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MUTATION_DURING_PAGINATION = "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"
+
+
+class FakePlaid:
+    """Local stand-in for the Plaid API that replays canned responses.
+
+    Serves plain HTTP on a free port, so both the Plaid SDK and
+    ``AsyncPlaidClient`` can be pointed at ``url``. /transactions/sync pages
+    are looked up by access token and cursor; ``mutations[token]`` makes that
+    many requests for a later page fail as if the item changed mid-pagination.
+    """
+
+    pages: dict[tuple[str, str], dict[str, t.Any]]
+    # (token, cursor) of the first page of every chain
+    starts: set[tuple[str, str]]
+    mutations: dict[str, int]
+    accounts: dict[str, list[dict[str, t.Any]]]
+    items: dict[str, str]
+    requests: list[tuple[str, dict[str, t.Any]]]
+
+    def __init__(self) -> None:
+        self.pages = {}
+        self.starts = set()
+        self.mutations = {}
+        self.accounts = {}
+        self.items = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, response = fake.handle(self.path, body)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args: t.Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakePlaid":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: t.Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_sync(
+        self, token: str, pages: list[dict[str, list]], cursor: str = ""
+    ) -> str:
+        """Chain ``pages`` (added/modified/removed) from ``cursor``, returning the last."""
+        self.starts.add((token, cursor))
+        for i, page in enumerate(pages):
+            next_cursor = f"{token}:{cursor}:{i}"
+            self.pages[(token, cursor)] = {
+                "added": page.get("added", []),
+                "modified": page.get("modified", []),
+                "removed": [{"transaction_id": x} for x in page.get("removed", [])],
+                "next_cursor": next_cursor,
+                "has_more": i < len(pages) - 1,
+                "request_id": "fake",
+            }
+            cursor = next_cursor
+        return cursor
+
+    def sync_requests(self, token: str) -> list[str]:
+        return [
+            x.get("cursor", "")
+            for path, x in self.requests
+            if path == "/transactions/sync" and x["access_token"] == token
+        ]
+
+    def handle(self, path: str, body: dict[str, t.Any]) -> tuple[int, dict[str, t.Any]]:
+        with self.lock:
+            self.requests.append((path, body))
+            token = body.get("access_token")
+            if path == "/transactions/sync":
+                cursor = body.get("cursor", "")
+                page = self.pages.get((token, cursor))
+                later = (token, cursor) not in self.starts
+                if page is not None and later and self.mutations.get(token, 0) > 0:
+                    self.mutations[token] -= 1
+                    return 400, error("TRANSACTIONS_ERROR", MUTATION_DURING_PAGINATION)
+                if page is None:
+                    return 400, error("INVALID_INPUT", "INVALID_FIELD")
+                return 200, page
+            if path == "/accounts/balance/get":
+                if token not in self.accounts:
+                    return 400, error("INVALID_INPUT", "INVALID_ACCESS_TOKEN")
+                return 200, {
+                    "accounts": self.accounts[token],
+                    "item": item(self.items.get(token, "")),
+                    "request_id": "fake",
+                }
+            if path == "/item/get":
+                if token not in self.items:
+                    return 400, error("INVALID_INPUT", "INVALID_ACCESS_TOKEN")
+                return 200, {"item": item(self.items[token]), "request_id": "fake"}
+            return 404, error("INVALID_REQUEST", "NOT_FOUND")
+
+
+def error(error_type: str, error_code: str) -> dict[str, t.Any]:
+    return {
+        "error_type": error_type,
+        "error_code": error_code,
+        "error_message": error_code.lower(),
+        "display_message": None,
+        "request_id": "fake",
+    }
+
+
+def item(item_id: str) -> dict[str, t.Any]:
+    return {
+        "item_id": item_id,
+        "institution_id": "ins_1",
+        "webhook": "",
+        "error": None,
+        "available_products": [],
+        "billed_products": ["transactions"],
+        "consent_expiration_time": None,
+        "update_type": "background",
+    }
+
+
+def transaction(
+    transaction_id: str,
+    date: str,
+    amount: float,
+    name: str,
+    account_id: str = "acc-1",
+    primary: str = "FOOD_AND_DRINK",
+) -> dict[str, t.Any]:
+    """A /transactions/sync record with every field the SDK requires."""
+    return {
+        "transaction_id": transaction_id,
+        "account_id": account_id,
+        "amount": amount,
+        "iso_currency_code": "USD",
+        "unofficial_currency_code": None,
+        "category": ["Food and Drink"],
+        "category_id": "13000000",
+        "date": date,
+        "authorized_date": date,
+        "authorized_datetime": None,
+        "datetime": None,
+        "location": {
+            "address": None,
+            "city": "Austin",
+            "region": "TX",
+            "postal_code": None,
+            "country": "US",
+            "lat": None,
+            "lon": None,
+            "store_number": None,
+        },
+        "payment_meta": {
+            "reference_number": None,
+            "ppd_id": None,
+            "payee": None,
+            "by_order_of": None,
+            "payer": None,
+            "payment_method": None,
+            "payment_processor": None,
+            "reason": None,
+        },
+        "name": name,
+        "merchant_name": name,
+        "payment_channel": "in store",
+        "pending": False,
+        "pending_transaction_id": None,
+        "account_owner": None,
+        "transaction_code": None,
+        "personal_finance_category": {"primary": primary, "detailed": primary},
+    }
+
+
+def account(account_id: str, name: str, available: float) -> dict[str, t.Any]:
+    return {
+        "account_id": account_id,
+        "name": name,
+        "official_name": name,
+        "mask": "0000",
+        "type": "depository",
+        "subtype": "checking",
+        "balances": {
+            "available": available,
+            "current": available,
+            "limit": None,
+            "iso_currency_code": "USD",
+            "unofficial_currency_code": None,
+        },
+    }
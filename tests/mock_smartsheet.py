@@ -0,0 +1,83 @@
+"""In-memory stand-in for the Smartsheet client.
+
+``MockSmartsheet`` implements the few ``client.Sheets`` calls that
+``SmartsheetManager`` makes and counts them, so exports can be exercised
+without an account.
+"""
+
+import itertools
+from types import SimpleNamespace
+
+from finance.smartsheet_manager import SmartsheetManager
+
+
+class MockSheets:
+    def __init__(self) -> None:
+        self.ids = itertools.count(1)
+        self.columns = {}
+        self.rows = {}
+        self.calls = {}
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def create(self, sheet_id: int, titles: list[str]) -> None:
+        self.columns[sheet_id] = [
+            SimpleNamespace(id=next(self.ids), title=x, index=i)
+            for i, x in enumerate(titles)
+        ]
+        self.rows[sheet_id] = {}
+
+    def get_sheet(self, sheet_id: int) -> SimpleNamespace:
+        self._count("get_sheet")
+        rows = [
+            SimpleNamespace(
+                id=row_id,
+                cells=[SimpleNamespace(column_id=x, value=y) for x, y in cells.items()],
+            )
+            for row_id, cells in self.rows[sheet_id].items()
+        ]
+        return SimpleNamespace(columns=list(self.columns[sheet_id]), rows=rows)
+
+    def get_columns(self, sheet_id: int, include_all: bool = False):
+        self._count("get_columns")
+        return SimpleNamespace(data=list(self.columns[sheet_id]))
+
+    def add_columns(self, sheet_id: int, columns: list) -> SimpleNamespace:
+        self._count("add_columns")
+        result = []
+        for column in columns:
+            result.append(
+                SimpleNamespace(
+                    id=next(self.ids),
+                    title=column.title,
+                    index=len(self.columns[sheet_id]),
+                )
+            )
+        self.columns[sheet_id].extend(result)
+        return SimpleNamespace(result=result)
+
+    def add_rows(self, sheet_id: int, rows: list) -> SimpleNamespace:
+        self._count("add_rows")
+        assert len(rows) <= SmartsheetManager.batch_size
+        result = []
+        for row in rows:
+            row_id = next(self.ids)
+            self.rows[sheet_id][row_id] = {
+                cell.column_id: cell.value for cell in row.cells
+            }
+            result.append(SimpleNamespace(id=row_id, cells=list(row.cells)))
+        return SimpleNamespace(result=result)
+
+    def update_rows(self, sheet_id: int, rows: list) -> None:
+        self._count("update_rows")
+        assert len(rows) <= SmartsheetManager.batch_size
+        for row in rows:
+            self.rows[sheet_id][row.id].update(
+                {cell.column_id: cell.value for cell in row.cells}
+            )
+
+
+class MockSmartsheet:
+    def __init__(self) -> None:
+        self.Sheets = MockSheets()
@@ -0,0 +1,262 @@
+import asyncio
+import contextlib
+import json
+from types import SimpleNamespace
+
+import httpx
+import pyarrow as pa
+import pytest
+
+import finance.main as main
+import finance.workspace as workspace
+from fake_plaid import account, transaction
+from finance.auth import ApiTokens
+from finance.plaid_manager import PlaidManager
+from finance.scheduler import RefreshScheduler
+from finance.workspace import Workspace
+
+
+@pytest.fixture
+def api(manager):
+    manager._set_transactions(
+        [
+            transaction(f"t{i}", f"2023-{i % 12 + 1:02d}-15", 10.0 + i, "SHOP")
+            for i in range(24)
+        ]
+    )
+    main.APP.dependency_overrides[main.workspace] = lambda: SimpleNamespace(
+        plaid_app=manager
+    )
+    yield
+    main.APP.dependency_overrides.clear()
+
+
+def request(method: str, url: str, **kwargs) -> httpx.Response:
+    async def send() -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.request(method, url, **kwargs)
+
+    return asyncio.run(send())
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/analytics/rolling/?window=0",
+        "/analytics/rolling/?window=-2",
+        "/analytics/rolling/?start=2023-13",
+        "/analytics/mom/?start=yesterday",
+        "/analytics/yoy/?end=2023-02-30",
+        "/plot_budget/?month=13&year=2023",
+        "/plot_transactions_in/?month=1&year=last",
+    ],
+)
+def test_malformed_query_parameters_are_rejected(api, url):
+    assert request("GET", url).status_code == 422
+
+
+def test_analytics_range(api):
+    response = request("GET", "/analytics/rolling/?window=2&start=2023-03&end=2023-04")
+    assert response.status_code == 200
+    assert '"month":"2023-03"' in response.json()
+    assert '"month":"2023-05"' not in response.json()
+
+
+@pytest.mark.parametrize(
+    "url, body",
+    [
+        ("/transactions/", {"month": "13", "year": "2023"}),
+        ("/transactions/", {"month": "0", "year": "2023"}),
+        ("/transactions/", {"month": "June", "year": "2023"}),
+        ("/yearly_transactions/", {"month": "1", "year": "23x"}),
+        ("/transactions/range/", {"start": "2023-02-30", "end": "2023-03-01"}),
+    ],
+)
+def test_transactions_reject_invalid_periods(api, url, body):
+    assert request("POST", url, json=body).status_code == 422
+
+
+def test_transactions_for_month(api):
+    response = request("POST", "/transactions/", json={"month": "03", "year": "2023"})
+    assert response.status_code == 200
+    assert len(httpx.Response(200, content=response.json()).json()) == 2
+
+
+def test_yearly_transactions_accept_the_frontends_request(api):
+    body = {"month": "", "year": "2023", "format": "json", "cursor": None}
+    response = request("POST", "/yearly_transactions/", json=body)
+    assert response.status_code == 200
+    assert len(response.json()["transactions"]) == 24
+
+
+def test_concurrent_periods_do_not_share_state(api):
+    async def send() -> list[httpx.Response]:
+        transport = httpx.ASGITransport(app=main.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            months = [
+                c.post("/transactions/", json={"month": str(x), "year": "2023"})
+                for x in range(1, 13)
+            ]
+            year = c.post("/yearly_transactions/", json={"month": "", "year": "2023"})
+            return await asyncio.gather(*months, year)
+
+    *months, year = asyncio.run(send())
+
+    for month, response in enumerate(months, 1):
+        ids = [x["transaction_id"] for x in json.loads(response.json())]
+        assert sorted(ids) == sorted([f"t{month - 1}", f"t{month + 11}"])
+    assert len(json.loads(year.json())) == 24
+
+
+def test_refresh_jobs_are_polled_by_id(manager):
+    async def refresh(access_tokens) -> None:
+        pass
+
+    scheduler = RefreshScheduler(refresh, lambda: [])
+    main.APP.dependency_overrides[main.workspace] = lambda: SimpleNamespace(
+        plaid_app=manager, scheduler=scheduler
+    )
+
+    async def send() -> tuple[dict, list[httpx.Response]]:
+        transport = httpx.ASGITransport(app=main.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            job = json.loads((await c.get("/refresh_data/")).json())
+            await scheduler.jobs[job["id"]].wait()
+            return job, [
+                await c.get(f"/refresh_status/?job_id={job['id']}"),
+                await c.get("/refresh_status/"),
+                await c.get(f"/refresh_status/?job_id={job['id'] + 1}"),
+            ]
+
+    try:
+        job, (by_id, latest, unknown) = asyncio.run(send())
+    finally:
+        main.APP.dependency_overrides.clear()
+
+    assert job["status"] == "pending"
+    assert json.loads(by_id.json())["status"] == "succeeded"
+    assert json.loads(latest.json())["id"] == job["id"]
+    assert unknown.status_code == 404
+
+
+@pytest.fixture
+def charts(api, manager, monkeypatch, tmp_path):
+    monkeypatch.setattr(workspace, "PlaidManager", lambda env, directory: manager)
+    ws = Workspace("alice", manager.env, tmp_path)
+    ws.load_budget()
+    main.APP.dependency_overrides[main.workspace] = lambda: ws
+    return ws
+
+
+def test_charts_are_revalidated_by_etag(charts):
+    url = "/plot_budget/?month=3&year=2023"
+    etag = request("GET", url).headers["ETag"]
+
+    response = request("GET", url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    request(
+        "POST",
+        "/rules/add/",
+        json={"search_str": "SHOP", "transaction_field": "name", "categorize": "GIFTS"},
+    )
+    response = request("GET", url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    etag = response.headers["ETag"]
+
+    budget = {**charts.budget.budget, "GIFTS": 123.0}
+    request("POST", "/budget/", json={"budget": budget})
+    response = request("GET", url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.fixture
+def many(manager):
+    manager._set_transactions(
+        [
+            transaction(f"t{i}", f"2023-01-{i % 28 + 1:02d}", 1.0, "SHOP")
+            for i in range(2500)
+        ]
+    )
+    main.APP.dependency_overrides[main.workspace] = lambda: SimpleNamespace(
+        plaid_app=manager
+    )
+    yield
+    main.APP.dependency_overrides.clear()
+
+
+def test_ndjson_pages_have_one_line_per_transaction(many):
+    body = {"month": "1", "year": "2023", "format": "ndjson", "limit": 5000}
+    response = request("POST", "/transactions/", json=body)
+    assert response.status_code == 200
+    lines = response.text.split("\n")
+    # Every line is terminated, none is blank
+    assert lines.pop() == ""
+    assert len(lines) == 2500
+    assert all(x.startswith("{") for x in lines)
+
+
+def test_arrow_pages_are_one_stream(many):
+    body = {"month": "1", "year": "2023", "format": "arrow", "limit": 5000}
+    response = request("POST", "/transactions/", json=body)
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 2500
+    assert sorted(table["transaction_id"].to_pylist()) == sorted(
+        f"t{i}" for i in range(2500)
+    )
+
+
+def test_cursors_survive_balance_refreshes_but_not_new_transactions(api, manager):
+    body = {"start": "2023-01-01", "end": "2023-12-31", "format": "json", "limit": 5}
+    page = request("POST", "/transactions/range/", json=body).json()
+    manager._set_balances([account("acc-1", "Checking", 10.0)])
+
+    body["cursor"] = page["next_cursor"]
+    response = request("POST", "/transactions/range/", json=body)
+    assert response.status_code == 200
+    assert len(response.json()["transactions"]) == 5
+
+    manager._set_transactions(manager.db.transactions()[0])
+    response = request("POST", "/transactions/range/", json=body)
+    assert response.status_code == 409
+
+
+def test_transactions_versions_are_unique_across_reloads(manager, tmp_path):
+    manager._set_transactions([])
+    reloaded = PlaidManager(manager.env, tmp_path)
+    reloaded._set_transactions([])
+    assert manager.transactions_version != reloaded.transactions_version
+
+
+def test_requests_need_an_issued_token(monkeypatch, tmp_path):
+    tokens = ApiTokens(tmp_path / ".api_tokens.csv")
+    token = tokens.issue("alice")
+    leased = []
+
+    class Leases:
+        @contextlib.asynccontextmanager
+        async def lease(self, user_id):
+            leased.append(user_id)
+            yield SimpleNamespace(plaid_app=SimpleNamespace(net_worth=12.5))
+
+    monkeypatch.setattr(main, "api_tokens", tokens, raising=False)
+    monkeypatch.setattr(main, "workspaces", Leases(), raising=False)
+
+    for headers in [
+        {},
+        {"X-User-Id": "alice"},
+        {"Authorization": "Bearer not-a-token"},
+        {"Authorization": token},
+    ]:
+        assert request("GET", "/net_worth/", headers=headers).status_code == 401
+    response = request(
+        "GET", "/net_worth/", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 200
+    assert response.json() == 12.5
+    assert leased == ["alice"]
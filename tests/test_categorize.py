@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+from fake_plaid import transaction
+
+NAMES = ["SHOP 1", "SHOP 2", "CAFE 1", "CAFE 2", "GAS"]
+
+
+def test_rule_edits_racing_syncs_keep_rule_index_consistent(manager):
+    records = [
+        transaction(f"t{i}", f"2023-{i % 12 + 1:02d}-01", i, NAMES[i % len(NAMES)])
+        for i in range(300)
+    ]
+    # Syncs alternate between two histories and end on the full one
+    syncs = [records[: 200 + 100 * (i % 2)] for i in range(40)]
+    manager._set_transactions(records)
+
+    def edit() -> None:
+        for i in range(40):
+            manager.add_rule(NAMES[i % len(NAMES)][:4], "name", f"C{i}")
+            if i % 3 == 2:
+                manager.remove_rule(0)
+
+    def sync() -> None:
+        for x in syncs:
+            manager._set_transactions(x)
+
+    threads = [threading.Thread(target=edit), threading.Thread(target=sync)]
+    for x in threads:
+        x.start()
+    for x in threads:
+        x.join()
+
+    df = manager.transactions_all
+    assert sorted(df["transaction_id"]) == sorted(x["transaction_id"] for x in records)
+    engine = manager.rules().engine()
+    np.testing.assert_array_equal(df["rule_index"].to_numpy(), engine.match(df))
+    assert df["user_category"].tolist() == engine.categorize(df).tolist()
+
+
+def test_category_totals_are_memoized_until_the_data_changes(manager, monkeypatch):
+    manager._set_transactions(
+        [
+            transaction("t1", "2023-01-02", 5.0, "SHOP 1"),
+            transaction("t2", "2023-01-03", 2.5, "CAFE 1"),
+            transaction("t3", "2023-02-01", 1.0, "CAFE 2"),
+        ]
+    )
+    manager.add_rule("SHOP", "name", "SHOPPING")
+    queries = []
+    category_totals = manager.db.category_totals
+
+    def counting_totals(start, end):
+        queries.append(start)
+        return category_totals(start, end)
+
+    monkeypatch.setattr(manager.db, "category_totals", counting_totals)
+
+    totals = manager.category_totals("1", "2023")
+    assert manager.category_totals("01", "2023") is totals
+    assert queries == ["2023-01-01"]
+    assert totals["SHOPPING"] == 5.0
+
+    manager.add_rule("CAFE", "name", "SHOPPING")
+    totals = manager.category_totals("1", "2023")
+    assert len(queries) == 2
+    assert totals.to_dict() == {"SHOPPING": 7.5}
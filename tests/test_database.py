@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from finance.database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database.shared(tmp_path / ".finance.db")
+    yield db
+    Database.release(db.filename)
+
+
+def test_reads_do_not_wait_for_a_write(db):
+    db.add_rule("COFFEE", "name", "COFFEE")
+    rules = []
+
+    with db.transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO rules (search_str, transaction_field, categorize) "
+            "VALUES ('TEA', 'name', 'TEA')"
+        )
+        # The writer holds the lock; a reader still sees the last commit
+        reader = threading.Thread(target=lambda: rules.append(db.rules()))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+
+    assert rules[0]["search_str"].tolist() == ["COFFEE"]
+    assert db.rules()["search_str"].tolist() == ["COFFEE", "TEA"]
+
+
+def test_release_closes_every_connection(db):
+    db.budget()
+    reader = threading.Thread(target=db.budget)
+    reader.start()
+    reader.join()
+    connections = [db.connection, *db.readers]
+
+    Database.release(db.filename)
+
+    assert len(connections) == 3
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+    assert Database.shared(db.filename) is not db
+
+
+def test_budget_amounts_are_upserted(db):
+    db.set_budget({"FOOD": 100.0, "RENT": 900.0})
+    db.set_budget_amount("FOOD", 150.0)
+    db.set_budget_amount("TRAVEL", 50.0)
+    assert db.budget() == {"FOOD": 150.0, "RENT": 900.0, "TRAVEL": 50.0}
+
+    db.set_budget({"RENT": 1000.0})
+    assert db.budget() == {"RENT": 1000.0}
+
+
+def test_version_1_databases_replace_the_transactions_mirror(tmp_path):
+    filename = tmp_path / ".finance.db"
+    connection = sqlite3.connect(filename)
+    connection.execute("CREATE TABLE transactions (transaction_id TEXT)")
+    connection.execute("INSERT INTO transactions VALUES ('t1')")
+    connection.execute("PRAGMA user_version = 1")
+    connection.commit()
+    connection.close()
+
+    db = Database(filename)
+    try:
+        assert db.transaction_count() == 0
+        columns = [x[1] for x in db.query("PRAGMA table_info(transactions)")]
+        assert "record" in columns
+    finally:
+        db.close()
+
+
+def test_pickled_records_and_cursors_are_imported(tmp_path):
+    # Records synced by the SDK hold date objects
+    pd.to_pickle(
+        {"t1": {"transaction_id": "t1", "date": date(2023, 1, 2), "amount": 1.0}},
+        tmp_path / ".transactions.pkl",
+    )
+    pd.DataFrame({"token": ["tok-a"], "cursor": ["c1"]}).to_csv(
+        tmp_path / ".cursors.csv", index=False
+    )
+
+    db = Database(tmp_path / ".finance.db")
+    try:
+        assert db.transactions() == (
+            [{"transaction_id": "t1", "date": "2023-01-02", "amount": 1.0}],
+            [None],
+        )
+        assert db.cursors() == {"tok-a": "c1"}
+    finally:
+        db.close()
+
+
+def test_totals_are_grouped_in_sql(db):
+    db.set_transactions(
+        [
+            {"transaction_id": "t1", "date": "2023-01-02", "amount": 5.0},
+            {"transaction_id": "t2", "date": "2023-01-31", "amount": 2.5},
+            {"transaction_id": "t3", "date": "2023-02-01", "amount": 1.0},
+        ]
+    )
+    db.set_categories(["t1", "t2", "t3"], ["FOOD", "FOOD", "TRAVEL"])
+
+    totals = db.category_totals("2023-01-01", "2023-01-31")
+    assert totals.to_dict() == {"FOOD": 7.5}
+    monthly = db.monthly_totals("plot_category")
+    assert sorted(map(tuple, monthly.values.tolist())) == [
+        ("2023-01", "FOOD", 7.5),
+        ("2023-02", "TRAVEL", 1.0),
+    ]
+    plan = db.query(
+        "EXPLAIN QUERY PLAN SELECT plot_category, SUM(amount) FROM transactions "
+        "WHERE date BETWEEN ? AND ? AND plot_category IS NOT NULL "
+        "GROUP BY plot_category",
+        ("2023-01-01", "2023-01-31"),
+    )
+    assert any("transactions_date" in x[-1] for x in plan)
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from finance.cache import save_frame
+from finance.history import BalanceHistory
+
+START = datetime(2023, 1, 1, 12)
+
+
+def balances(total: float) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "account_id": ["a", "b"],
+            "name": ["Checking", "Savings"],
+            "balances": [total / 4, total * 3 / 4],
+        }
+    )
+
+
+def test_appends_write_snapshot_files_and_compact(tmp_path):
+    history = BalanceHistory(tmp_path)
+    history.compact_every = 5
+    for i in range(12):
+        history.append(balances(100.0 * i), START + timedelta(days=i))
+
+    assert (tmp_path / "2023.arrow").exists()
+    assert len(list(tmp_path.glob("2023_*.arrow"))) == 2
+    df = history.read()
+    assert len(df) == 24
+    assert df["timestamp"].is_monotonic_increasing
+    assert history.net_worth(freq="D").tolist() == [100.0 * i for i in range(12)]
+
+
+def test_append_leaves_the_yearly_file_alone(tmp_path):
+    history = BalanceHistory(tmp_path)
+    history.compact_every = 2
+    history.append(balances(1.0), START)
+    history.append(balances(2.0), START + timedelta(days=1))
+    yearly = (tmp_path / "2023.arrow").stat().st_mtime_ns
+
+    history.append(balances(3.0), START + timedelta(days=2))
+
+    assert (tmp_path / "2023.arrow").stat().st_mtime_ns == yearly
+    assert history.net_worth(freq="D").tolist() == [1.0, 2.0, 3.0]
+
+
+def test_rows_in_both_files_are_read_once(tmp_path):
+    # As left by a crash between compacting and removing the snapshot files
+    history = BalanceHistory(tmp_path)
+    history.append(balances(1.0), START)
+    history.append(balances(2.0), START + timedelta(days=1))
+    save_frame(history.read(), tmp_path / "2023.arrow")
+
+    assert len(history.read()) == 4
+    history.compact(2023)
+    assert list(tmp_path.glob("2023_*.arrow")) == []
+    assert len(history.read()) == 4
+
+
+def test_read_spans_years(tmp_path):
+    history = BalanceHistory(tmp_path)
+    for i in range(4):
+        history.append(balances(float(i)), datetime(2021 + i, 6, 1))
+
+    df = history.read(date(2022, 1, 1), date(2023, 12, 31))
+    assert df["timestamp"].dt.year.unique().tolist() == [2022, 2023]
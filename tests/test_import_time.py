@@ -0,0 +1,54 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+MODULE = "finance.main"
+BUDGET_MS = 1500.0
+RUNS = 3
+
+# Loaded on first use only
+DEFERRED = ["matplotlib", "smartsheet", "bokeh", "finance.plotters", "selenium"]
+
+ROOT = Path(__file__).parents[1]
+
+# Fresh interpreters don't get conftest's keystore shim, so they install it too
+SHIM = f"""
+import importlib.util, sys
+from pathlib import Path
+keys = Path({str(ROOT / "finance" / "api_keys")!r})
+if not (keys / "keystore.py").exists():
+    spec = importlib.util.spec_from_file_location(
+        "finance.api_keys.keystore", keys / "sample_keystore.py"
+    )
+    keystore = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(keystore)
+    sys.modules["finance.api_keys.keystore"] = keystore
+"""
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, check=True, cwd=ROOT
+    )
+
+
+def import_time_ms(module: str) -> float:
+    result = run_python("-X", "importtime", "-c", f"{SHIM}\nimport {module}")
+    # Lines look like "import time: self [us] | cumulative | module"
+    for line in result.stderr.splitlines():
+        fields = [x.strip() for x in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise AssertionError(f"no import time reported for {module}")
+
+
+def test_server_imports_within_budget():
+    elapsed = min(import_time_ms(MODULE) for _ in range(RUNS))
+    assert elapsed <= BUDGET_MS, f"import {MODULE} took {elapsed:.0f} ms"
+
+
+def test_heavy_stacks_are_not_imported_at_startup():
+    code = f"{SHIM}\nimport json, {MODULE}\nprint(json.dumps(sorted(sys.modules)))"
+    loaded = set(json.loads(run_python("-c", code).stdout.splitlines()[-1]))
+    assert [x for x in DEFERRED if x in loaded] == []
@@ -0,0 +1,31 @@
+import asyncio
+
+from finance import metrics
+
+
+def test_tasks_spawned_by_a_request_stop_adding_timings(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_histograms", {})
+
+    async def background(done: asyncio.Event) -> None:
+        await done.wait()
+        metrics.observe("refresh_seconds", 1.0)
+
+    async def handle(done: asyncio.Event) -> tuple[metrics.Timings, asyncio.Task]:
+        timings = metrics.collect_timings()
+        # Like a refresh scheduled by the request, the task copies its context
+        task = asyncio.create_task(background(done))
+        metrics.observe("request_seconds", 0.5)
+        timings.close()
+        return timings, task
+
+    async def run() -> metrics.Timings:
+        done = asyncio.Event()
+        timings, task = await asyncio.create_task(handle(done))
+        done.set()
+        await task
+        return timings
+
+    timings = asyncio.run(run())
+    assert timings.entries == [("request_seconds", "", 0.5)]
+    assert ("refresh_seconds", ()) in metrics._histograms
@@ -0,0 +1,147 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from finance.database import Database
+from finance.normalize import normalize_transactions
+from finance.rules import RuleEngine, Rules
+
+WORDS = ["AMAZON", "AMAZON PRIME", "PRIME", "ZON", "STARBUCKS", "STAR", "BUCK", ""]
+
+
+def reference_match(rules: pd.DataFrame, df: pd.DataFrame) -> np.ndarray:
+    # The original per-rule loop: substring for strings, membership for lists,
+    # and the last matching rule wins
+    winners = np.full(len(df), -1, dtype=np.int64)
+    for position, (search_str, field) in enumerate(
+        zip(rules["search_str"], rules["transaction_field"])
+    ):
+        if field not in df.columns:
+            continue
+        for i, value in enumerate(df[field]):
+            if isinstance(value, (str, list)) and str(search_str) in value:
+                winners[i] = position
+    return winners
+
+
+def make_frame(rng: random.Random, rows: int) -> pd.DataFrame:
+    def text() -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randrange(4)))
+
+    return pd.DataFrame(
+        {
+            "name": [text() for _ in range(rows)],
+            "merchant_name": [rng.choice([None, np.nan, text()]) for _ in range(rows)],
+            "category": [
+                [rng.choice(WORDS) for _ in range(rng.randrange(3))]
+                for _ in range(rows)
+            ],
+            "amount": [rng.random() for _ in range(rows)],
+        }
+    )
+
+
+def make_rules(rng: random.Random, count: int) -> pd.DataFrame:
+    fields = ["name", "merchant_name", "category", "amount", "missing"]
+    return pd.DataFrame(
+        [(rng.choice(WORDS), rng.choice(fields), f"CAT_{i}") for i in range(count)],
+        columns=Rules.rule_columns,
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_last_rule_wins_like_the_original_loop(seed):
+    rng = random.Random(seed)
+    df = make_frame(rng, 200)
+    rules = make_rules(rng, rng.randrange(1, 40))
+    expected = reference_match(rules, df)
+    np.testing.assert_array_equal(RuleEngine(rules).match(df), expected)
+
+
+def test_overlapping_patterns_pick_the_highest_position():
+    rules = pd.DataFrame(
+        [
+            ("AMAZON PRIME", "name", "a"),
+            ("PRIME", "name", "b"),
+            ("AMAZON", "name", "c"),
+        ],
+        columns=Rules.rule_columns,
+    )
+    df = pd.DataFrame({"name": ["AMAZON PRIME VIDEO", "PRIME", "NETFLIX"]})
+    assert RuleEngine(rules).categorize(df).tolist() == ["c", "b", ""]
+
+
+def test_empty_ruleset_and_frame():
+    empty = pd.DataFrame(columns=Rules.rule_columns)
+    df = pd.DataFrame({"name": ["A"]})
+    assert RuleEngine(empty).match(df).tolist() == [-1]
+    rules = pd.DataFrame([("A", "name", "x")], columns=Rules.rule_columns)
+    assert RuleEngine(rules).match(df.iloc[:0]).tolist() == []
+
+
+def test_rules_on_nested_objects_search_their_flattened_columns():
+    df = normalize_transactions(
+        [
+            {
+                "transaction_id": "t1",
+                "date": "2023-01-02",
+                "amount": 1.0,
+                "location": {"city": "Austin", "region": "TX"},
+                "personal_finance_category": {
+                    "primary": "TRAVEL",
+                    "detailed": "TRAVEL_FLIGHTS",
+                },
+            },
+            {
+                "transaction_id": "t2",
+                "date": "2023-01-03",
+                "amount": 2.0,
+                "location": {"city": "Boston", "region": "MA"},
+                "payment_meta": {"payee": "Landlord"},
+            },
+        ]
+    )
+    rules = pd.DataFrame(
+        [
+            ("TX", "location", "texas"),
+            ("FLIGHTS", "personal_finance_category", "flights"),
+            ("Landlord", "payment_meta", "rent"),
+            ("Austin", "location_city", "austin"),
+        ],
+        columns=Rules.rule_columns,
+    )
+    assert RuleEngine(rules).categorize(df).tolist() == ["austin", "rent"]
+    assert RuleEngine(rules.iloc[:2]).categorize(df).tolist() == ["flights", ""]
+
+
+def test_rule_edits_are_versioned_and_persisted(tmp_path):
+    filename = tmp_path / ".finance.db"
+    rules = Rules.shared(filename)
+    try:
+        rules.add_rule("COFFEE", "name", "FOOD")
+        rules.add_rule("GAS", "name", "CAR")
+        engine = rules.engine()
+        # Adding an existing rule changes nothing
+        rules.add_rule("COFFEE", "name", "FOOD")
+        assert rules.version == 2
+        assert rules.engine() is engine
+
+        rules.add_rule("TOLL", "name", "CAR")
+        rules.remove_rule(0)
+        assert rules.version == 4
+        assert rules.engine().version == 4
+
+        reloaded = Rules(filename)
+        assert reloaded.rules.values.tolist() == [
+            ["GAS", "name", "CAR"],
+            ["TOLL", "name", "CAR"],
+        ]
+        assert reloaded.ids == rules.ids
+        assert Rules.shared(filename) is rules
+        Rules.release(filename)
+        assert Rules.shared(filename) is not rules
+    finally:
+        Rules.release(filename)
+        Database.release(filename)
@@ -0,0 +1,57 @@
+import asyncio
+
+from finance.scheduler import RefreshScheduler
+
+
+class FakeRefresh:
+    """Records the tokens of every refresh, which waits until released."""
+
+    def __init__(self) -> None:
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, access_tokens) -> None:
+        self.calls.append(access_tokens)
+        await self.release.wait()
+        if access_tokens == ["bad"]:
+            raise ValueError("bad token")
+
+
+def test_triggers_are_coalesced():
+    async def run() -> None:
+        refresh = FakeRefresh()
+        scheduler = RefreshScheduler(refresh, lambda: ["tok-a", "tok-b"])
+
+        first = scheduler.trigger(["tok-a"])
+        assert scheduler.trigger(["tok-b"]) is first
+        await asyncio.sleep(0)
+        assert first.status == "running"
+
+        # Both arrive while the first job runs, and share one follow-up
+        second = scheduler.trigger(["tok-a"])
+        assert scheduler.trigger() is second
+        refresh.release.set()
+        await second.wait()
+
+        assert refresh.calls == [["tok-a", "tok-b"], None]
+        assert [x.status for x in scheduler.jobs.values()] == ["succeeded"] * 2
+        assert scheduler.latest() is second
+        assert not scheduler.busy()
+
+    asyncio.run(run())
+
+
+def test_failed_jobs_report_their_error():
+    async def run() -> None:
+        refresh = FakeRefresh()
+        refresh.release.set()
+        scheduler = RefreshScheduler(refresh, lambda: ["bad"])
+
+        job = await scheduler.trigger(["bad"]).wait()
+
+        assert job.to_dict()["status"] == "failed"
+        assert job.error == "ValueError('bad token')"
+        assert job.started <= job.finished
+        assert scheduler.last_refreshed == {}
+
+    asyncio.run(run())
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import finance.main as main
+from finance.export import SmartsheetExporter
+from finance.smartsheet_manager import SmartsheetManager
+from finance.workspace import DEFAULT_USER
+from mock_smartsheet import MockSmartsheet
+
+ROWS = 1200
+
+
+@pytest.fixture
+def client():
+    client = MockSmartsheet()
+    client.Sheets.create(1, ["Primary Column"])
+    return client
+
+
+def make_data(rows: int) -> dict[str, list]:
+    return {
+        "transaction_id": [f"txn-{i}" for i in range(rows)],
+        "amount": [float(i) for i in range(rows)],
+        "merchant_name": [None if i % 3 else "Shop" for i in range(rows)],
+    }
+
+
+def test_upsert_adds_new_rows_in_batches(client):
+    manager = SmartsheetManager(client)
+
+    assert manager.upsert_rows(1, make_data(ROWS), "transaction_id") == (ROWS, 0)
+    assert len(client.Sheets.rows[1]) == ROWS
+    assert client.Sheets.calls["get_sheet"] == 1
+    assert client.Sheets.calls["add_rows"] == -(-ROWS // manager.batch_size)
+
+
+def test_upsert_skips_unchanged_rows(client):
+    manager = SmartsheetManager(client)
+    data = make_data(ROWS)
+    manager.upsert_rows(1, data, "transaction_id")
+    calls = dict(client.Sheets.calls)
+
+    assert manager.upsert_rows(1, data, "transaction_id") == (0, 0)
+    assert client.Sheets.calls["get_sheet"] == calls["get_sheet"] + 1
+    assert client.Sheets.calls["add_rows"] == calls["add_rows"]
+    assert "update_rows" not in client.Sheets.calls
+
+
+def test_upsert_updates_changed_rows_and_adds_new_ones(client):
+    manager = SmartsheetManager(client)
+    data = make_data(ROWS)
+    manager.upsert_rows(1, data, "transaction_id")
+
+    data["amount"][:10] = [-1.0] * 10
+    data["transaction_id"].append("txn-new")
+    data["amount"].append(1.0)
+    data["merchant_name"].append(None)
+
+    assert manager.upsert_rows(1, data, "transaction_id") == (1, 10)
+    assert len(client.Sheets.rows[1]) == ROWS + 1
+    assert client.Sheets.calls["update_rows"] == 1
+
+
+def test_upsert_rejects_ragged_columns(client):
+    manager = SmartsheetManager(client)
+    with pytest.raises(ValueError):
+        manager.upsert_rows(
+            1, {"transaction_id": ["a"], "amount": []}, "transaction_id"
+        )
+
+
+def make_exporter(client, tmp_path, monkeypatch) -> SmartsheetExporter:
+    monkeypatch.setattr(
+        SmartsheetExporter, "state_filename", tmp_path / ".export_state.csv"
+    )
+    manager = SmartsheetManager(client)
+    manager.sheets = [SimpleNamespace(name="Transactions", id=1)]
+    return SmartsheetExporter(manager)
+
+
+def test_export_downloads_the_sheet_once(client, tmp_path, monkeypatch):
+    exporter = make_exporter(client, tmp_path, monkeypatch)
+    exporter.checkpoint_rows = 1000
+    df = pd.DataFrame(make_data(2500))
+    # txn-0 is added by the first chunk and changed by the last one
+    df = pd.concat([df, df.iloc[[0]].assign(amount=-1.0)], ignore_index=True)
+
+    assert exporter.export("Transactions", df, "transaction_id") == 2501
+    assert client.Sheets.calls["get_sheet"] == 1
+    assert client.Sheets.calls["update_rows"] == 1
+    assert len(client.Sheets.rows[1]) == 2500
+    assert -1.0 in [x for row in client.Sheets.rows[1].values() for x in row.values()]
+
+
+def test_refresh_during_an_export_runs_it_again(monkeypatch):
+    runs = []
+
+    class Exporter:
+        def run(self, transactions, history) -> None:
+            runs.append(transactions)
+            time.sleep(0.05)
+
+    async def run() -> None:
+        ws = SimpleNamespace(
+            user_id=DEFAULT_USER,
+            plaid_app=SimpleNamespace(transactions_all="first", history=None),
+        )
+        main.refreshed(ws)
+        await asyncio.sleep(0.01)
+        ws.plaid_app.transactions_all = "second"
+        main.refreshed(ws)
+        main.refreshed(ws)
+        await main.export_task
+
+    monkeypatch.setattr(main, "exporter", Exporter())
+    monkeypatch.setattr(main, "export_task", None)
+    asyncio.run(run())
+    assert runs == ["first", "second"]
@@ -0,0 +1,290 @@
+import asyncio
+import json
+
+import pytest
+
+from fake_plaid import account, transaction
+import finance.metrics as metrics
+from finance.plaid_manager import PlaidManager
+from finance.rules import RuleEngine
+
+
+def sync(manager: PlaidManager, times: int = 1) -> None:
+    async def run() -> None:
+        try:
+            for _ in range(times):
+                await manager.async_sync_transactions()
+        finally:
+            await manager.async_client.aclose()
+
+    asyncio.run(run())
+
+
+def amounts(manager: PlaidManager) -> dict[str, float]:
+    df = manager.transactions_all
+    return dict(zip(df["transaction_id"], df["amount"]))
+
+
+def test_sync_applies_added_modified_and_removed(fake_plaid, manager):
+    manager.add_token("tok-a")
+    cursor = fake_plaid.add_sync(
+        "tok-a",
+        [
+            {"added": [transaction("t1", "2023-01-02", 5.0, "COFFEE")]},
+            {
+                "added": [
+                    transaction("t2", "2023-01-03", 7.5, "LUNCH"),
+                    transaction("t3", "2023-02-01", 12.0, "DINNER"),
+                ]
+            },
+        ],
+    )
+    last = fake_plaid.add_sync(
+        "tok-a",
+        [
+            {
+                "added": [transaction("t4", "2023-02-05", 3.0, "TEA")],
+                "modified": [transaction("t1", "2023-01-02", 6.0, "COFFEE")],
+                "removed": ["t2"],
+            }
+        ],
+        cursor,
+    )
+
+    sync(manager, times=2)
+
+    assert amounts(manager) == {"t1": 6.0, "t3": 12.0, "t4": 3.0}
+    assert manager.db.cursors() == {"tok-a": last}
+    assert fake_plaid.sync_requests("tok-a") == ["", "tok-a::0", cursor]
+
+
+def test_mutation_during_pagination_restarts_from_first_page(fake_plaid, manager):
+    manager.add_token("tok-a")
+    last = fake_plaid.add_sync(
+        "tok-a",
+        [
+            {"added": [transaction("t1", "2023-01-02", 5.0, "COFFEE")]},
+            {"added": [transaction("t2", "2023-01-03", 7.5, "LUNCH")]},
+        ],
+    )
+    fake_plaid.mutations["tok-a"] = 2
+
+    sync(manager)
+
+    assert amounts(manager) == {"t1": 5.0, "t2": 7.5}
+    assert manager.db.cursors() == {"tok-a": last}
+    assert fake_plaid.sync_requests("tok-a") == ["", "tok-a::0"] * 3
+
+
+def test_sync_gives_up_on_an_item_that_keeps_changing(fake_plaid, manager):
+    manager.add_token("tok-a")
+    manager.add_token("tok-b")
+    fake_plaid.add_sync(
+        "tok-a",
+        [
+            {"added": [transaction("t1", "2023-01-02", 5.0, "COFFEE")]},
+            {"added": [transaction("t2", "2023-01-03", 7.5, "LUNCH")]},
+        ],
+    )
+    last = fake_plaid.add_sync(
+        "tok-b", [{"added": [transaction("t3", "2023-01-04", 1.0, "GUM")]}]
+    )
+    fake_plaid.mutations["tok-a"] = 100
+
+    sync(manager)
+
+    # The other item is still applied, and tok-a starts over next time
+    assert amounts(manager) == {"t3": 1.0}
+    assert manager.db.cursors() == {"tok-b": last}
+    restarts = manager.sync_restarts
+    assert fake_plaid.sync_requests("tok-a") == ["", "tok-a::0"] * (restarts + 1)
+
+
+def test_store_keeps_plaid_json(fake_plaid, manager):
+    manager.add_token("tok-a")
+    fake_plaid.add_sync(
+        "tok-a", [{"added": [transaction("t1", "2023-01-02", 5.0, "COFFEE")]}]
+    )
+
+    sync(manager)
+
+    (record,), _ = manager.db.transactions()
+    assert record["date"] == "2023-01-02"
+    assert json.loads(json.dumps(record)) == record
+
+
+def test_balances_and_token_check_use_the_async_client(fake_plaid, manager):
+    manager.add_token("tok-a")
+    manager.add_token("tok-b")
+    fake_plaid.accounts["tok-a"] = [account("acc-1", "Checking", 100.0)]
+
+    async def run() -> list[str]:
+        try:
+            await manager.async_get_balances(["tok-a"])
+            return await manager.async_check_existing_tokens()
+        finally:
+            await manager.async_client.aclose()
+
+    assert asyncio.run(run()) == ["tok-b"]
+    assert manager.net_worth == 100.0
+    assert manager.balances["legend"].tolist() == ["Checking - Checking"]
+
+
+def test_refresh_resolves_items_once_and_labels_requests(
+    fake_plaid, manager, monkeypatch
+):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_histograms", {})
+    manager.add_token("tok-a")
+    manager.add_token("tok-b")
+    fake_plaid.items["tok-a"] = "item-a"
+    fake_plaid.accounts["tok-a"] = fake_plaid.accounts["tok-b"] = []
+    fake_plaid.add_sync("tok-a", [{}])
+    fake_plaid.add_sync("tok-b", [{}])
+
+    async def run() -> None:
+        try:
+            await manager.async_refresh()
+            await manager.async_refresh()
+        finally:
+            await manager.async_client.aclose()
+
+    asyncio.run(run())
+
+    # tok-b has no item, and is only looked up again for a webhook
+    assert manager.item_tokens == {"item-a": "tok-a"}
+    item_gets = [
+        x["access_token"] for path, x in fake_plaid.requests if path == "/item/get"
+    ]
+    assert sorted(item_gets) == ["tok-a", "tok-b"]
+    labels = {
+        dict(x)["item"]
+        for name, x in metrics._histograms
+        if name == "plaid_request_seconds"
+    }
+    assert labels == {"item-a", "unknown"}
+
+
+def test_warm_start_loads_the_cache_and_applies_newer_rules(
+    fake_plaid, manager, monkeypatch, tmp_path
+):
+    manager.add_token("tok-a")
+    fake_plaid.accounts["tok-a"] = [account("acc-1", "Checking", 100.0)]
+    fake_plaid.add_sync(
+        "tok-a",
+        [
+            {
+                "added": [
+                    transaction("t1", "2023-01-02", 5.0, "COFFEE"),
+                    transaction("t2", "2023-01-03", 7.5, "LUNCH"),
+                ]
+            }
+        ],
+    )
+
+    async def run() -> None:
+        try:
+            await manager.async_refresh()
+        finally:
+            await manager.async_client.aclose()
+
+    asyncio.run(run())
+    manager.save_cache()
+    cached = manager.transactions_all
+    # Edited after the cache was written
+    manager.rules().add_rule("LUNCH", "name", "MEALS")
+
+    reloaded = PlaidManager(manager.env, tmp_path)
+    monkeypatch.setattr(
+        PlaidManager, "_load_transactions", lambda self: pytest.fail("not cached")
+    )
+    reloaded.load_stored()
+
+    assert reloaded.net_worth == 100.0
+    df = reloaded.transactions_all
+    assert df["transaction_id"].tolist() == cached["transaction_id"].tolist()
+    assert df.dtypes.astype(str).tolist() == cached.dtypes.astype(str).tolist()
+    categories = dict(zip(df["transaction_id"], df["plot_category"]))
+    assert categories["t2"] == "MEALS"
+
+
+def test_a_cache_older_than_the_stored_transactions_is_not_loaded(
+    fake_plaid, manager, tmp_path
+):
+    manager.add_token("tok-a")
+    cursor = fake_plaid.add_sync(
+        "tok-a", [{"added": [transaction("t1", "2023-01-02", 5.0, "COFFEE")]}]
+    )
+    fake_plaid.add_sync(
+        "tok-a", [{"added": [transaction("t2", "2023-01-03", 2.0, "TEA")]}], cursor
+    )
+
+    async def run() -> None:
+        try:
+            await manager.async_sync_transactions()
+            manager.save_cache()
+            # Synced again, but stopped before the cache was saved
+            await manager.async_sync_transactions()
+        finally:
+            await manager.async_client.aclose()
+
+    asyncio.run(run())
+
+    reloaded = PlaidManager(manager.env, tmp_path)
+    reloaded.load_stored()
+    assert amounts(reloaded) == {"t1": 5.0, "t2": 2.0}
+
+
+def test_only_the_delta_is_categorized(fake_plaid, manager, monkeypatch, capsys):
+    manager.add_token("tok-a", "item-a")
+    manager.add_rule("COFFEE", "name", "COFFEE")
+    cursor = fake_plaid.add_sync(
+        "tok-a",
+        [
+            {
+                "added": [
+                    transaction("t1", "2023-01-02", 5.0, "COFFEE"),
+                    transaction("t2", "2023-01-03", 7.5, "LUNCH"),
+                ]
+            }
+        ],
+    )
+    fake_plaid.add_sync(
+        "tok-a",
+        [
+            {
+                "added": [transaction("t3", "2023-01-04", 3.0, "COFFEE")],
+                "modified": [transaction("t2", "2023-01-03", 8.0, "COFFEE")],
+            }
+        ],
+        cursor,
+    )
+    matched = []
+    match = RuleEngine.match
+
+    def counting_match(self, df):
+        matched.append(len(df))
+        return match(self, df)
+
+    async def run() -> None:
+        try:
+            await manager.async_sync_transactions()
+            monkeypatch.setattr(RuleEngine, "match", counting_match)
+            await manager.async_sync_transactions()
+        finally:
+            await manager.async_client.aclose()
+
+    asyncio.run(run())
+
+    assert matched == [2]
+    df = manager.transactions_all
+    assert df["transaction_id"].tolist() == ["t1", "t2", "t3"]
+    assert df["plot_category"].tolist() == ["COFFEE"] * 3
+    records, categories = manager.db.transactions()
+    assert sorted(zip((x["transaction_id"] for x in records), categories)) == [
+        ("t1", "COFFEE"),
+        ("t2", "COFFEE"),
+        ("t3", "COFFEE"),
+    ]
+    out = capsys.readouterr().out
+    assert "synced item-a" in out and "tok-a" not in out
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import time
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+from jwt.algorithms import ECAlgorithm
+
+import finance.main as main
+from finance.scheduler import RefreshScheduler
+from finance.webhooks import WebhookVerifier
+
+BODY = b'{"webhook_type": "TRANSACTIONS"}'
+
+
+def sign(key: ec.EllipticCurvePrivateKey, body: bytes, kid: str) -> str:
+    claims = {
+        "iat": int(time.time()),
+        "request_body_sha256": hashlib.sha256(body).hexdigest(),
+    }
+    return jwt.encode(claims, key, algorithm="ES256", headers={"kid": kid})
+
+
+def public_jwk(key: ec.EllipticCurvePrivateKey) -> dict:
+    return json.loads(ECAlgorithm.to_jwk(key.public_key()))
+
+
+class Keys:
+    """fetch_key for a verifier, counting its calls."""
+
+    def __init__(self, keys: dict[str, dict]) -> None:
+        self.keys = keys
+        self.fetches: list[str] = []
+
+    async def __call__(self, key_id: str) -> dict:
+        self.fetches.append(key_id)
+        return self.keys[key_id]
+
+
+def test_unknown_key_ids_are_not_fetched_again():
+    key = ec.generate_private_key(ec.SECP256R1())
+    keys = Keys({})
+    verifier = WebhookVerifier(keys)
+    verifier.fetch_interval = 0.0
+
+    for _ in range(3):
+        assert not asyncio.run(verifier.verify(BODY, sign(key, BODY, "forged")))
+    assert keys.fetches == ["forged"]
+
+
+def test_key_fetches_are_rate_limited_per_key_id():
+    key = ec.generate_private_key(ec.SECP256R1())
+    keys = Keys({"rotated": public_jwk(key)})
+    verifier = WebhookVerifier(keys)
+    verifier.key_ttl = 0.0
+
+    for i in range(5):
+        assert not asyncio.run(verifier.verify(BODY, sign(key, BODY, f"forged{i}")))
+    # Forged key ids don't hold back a key that was just rotated in
+    assert asyncio.run(verifier.verify(BODY, sign(key, BODY, "rotated")))
+    # but the same key isn't fetched again within fetch_interval
+    assert asyncio.run(verifier.verify(BODY, sign(key, BODY, "rotated")))
+    assert keys.fetches == [*(f"forged{i}" for i in range(5)), "rotated"]
+
+    verifier.fetch_interval = 0.0
+    assert asyncio.run(verifier.verify(BODY, sign(key, BODY, "rotated")))
+    assert keys.fetches[-2:] == ["rotated", "rotated"]
+
+
+def test_cached_keys_are_refetched_to_see_them_expire():
+    key = ec.generate_private_key(ec.SECP256R1())
+    keys = Keys({"k": public_jwk(key)})
+    verifier = WebhookVerifier(keys)
+    assert asyncio.run(verifier.verify(BODY, sign(key, BODY, "k")))
+    assert asyncio.run(verifier.verify(BODY, sign(key, BODY, "k")))
+    assert keys.fetches == ["k"]
+
+    keys.keys["k"] = {**keys.keys["k"], "expired_at": int(time.time())}
+    verifier.key_ttl = verifier.fetch_interval = 0.0
+    assert not asyncio.run(verifier.verify(BODY, sign(key, BODY, "k")))
+    assert keys.fetches == ["k", "k"]
+
+
+def test_webhook_without_item_id_is_a_bad_request(monkeypatch):
+    key = ec.generate_private_key(ec.SECP256R1())
+    verifier = WebhookVerifier(Keys({}))
+    verifier.add_key("k", public_jwk(key))
+    monkeypatch.setattr(main, "webhook_verifier", verifier, raising=False)
+
+    async def post(body: bytes) -> httpx.Response:
+        transport = httpx.ASGITransport(app=main.APP)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.post(
+                "/plaid/webhook/",
+                content=body,
+                headers={"Plaid-Verification": sign(key, body, "k")},
+            )
+
+    event = {"webhook_type": "TRANSACTIONS", "webhook_code": "DEFAULT_UPDATE"}
+    assert asyncio.run(post(json.dumps(event).encode())).status_code == 400
+    assert asyncio.run(post(b"not json")).status_code == 400
+
+
+def test_debounce_fires_after_max_wait_under_a_steady_stream():
+    refreshed = []
+
+    async def refresh(access_tokens):
+        refreshed.append(access_tokens)
+
+    async def run() -> None:
+        scheduler = RefreshScheduler(refresh, lambda: ["a"])
+        # A webhook every 10 ms never leaves a 50 ms quiet period
+        for _ in range(30):
+            scheduler.debounce(["a"], 0.05, max_wait=0.1)
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert refreshed and refreshed[0] == ["a"]
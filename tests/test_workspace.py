@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+
+import finance.plaid_manager as plaid_manager
+import finance.workspace as workspace
+from fake_plaid import transaction
+from finance.plaid_manager import PlaidManager
+from finance.workspace import DEFAULT_USER, Workspace, Workspaces
+
+
+class FakeWorkspace:
+    """Stands in for Workspace, recording opens and closes."""
+
+    def __init__(self, user_id, env, directory, on_refresh) -> None:
+        self.user_id = user_id
+        self.leases = 0
+        self.refreshing = False
+        self.closed = False
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+    @property
+    def idle(self) -> bool:
+        return self.leases == 0 and not self.refreshing
+
+
+@pytest.fixture
+def workspaces(monkeypatch, tmp_path):
+    monkeypatch.setattr(workspace, "Workspace", FakeWorkspace)
+    monkeypatch.setattr(Workspaces, "root", tmp_path)
+    return Workspaces("env", max_users=2)
+
+
+def test_leased_workspaces_are_evicted_once_released(workspaces):
+    workspaces.max_users = 1
+
+    async def run() -> None:
+        async with workspaces.lease("alice") as alice:
+            async with workspaces.lease("bob") as bob:
+                # Over the limit, but both are in use
+                assert list(workspaces.loaded) == ["alice", "bob"]
+            assert bob.closed and not alice.closed
+        assert list(workspaces.loaded) == ["alice"]
+
+        async with workspaces.lease("carol"):
+            assert alice.closed
+            assert list(workspaces.loaded) == ["carol"]
+
+    asyncio.run(run())
+
+
+def test_busy_and_default_workspaces_are_not_evicted(workspaces):
+    async def run() -> None:
+        async with workspaces.lease(DEFAULT_USER) as default:
+            pass
+        async with workspaces.lease("alice") as alice:
+            alice.refreshing = True
+        async with workspaces.lease("bob") as bob:
+            pass
+        assert bob.closed
+        assert not default.closed and not alice.closed
+        assert list(workspaces.loaded) == [DEFAULT_USER, "alice"]
+
+        alice.refreshing = False
+        async with workspaces.lease("carol"):
+            pass
+        assert alice.closed
+        assert list(workspaces.loaded) == [DEFAULT_USER, "carol"]
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_share_one_load(workspaces):
+    async def run() -> list:
+        return await asyncio.gather(*(workspaces.acquire("alice") for _ in range(3)))
+
+    first, *others = asyncio.run(run())
+    assert all(x is first for x in others)
+    assert first.leases == 3
+
+
+def test_open_serves_stored_transactions_without_waiting(
+    fake_plaid, manager, monkeypatch, tmp_path
+):
+    manager.add_token("tok-a")
+    manager.db.set_transactions([transaction("t1", "2023-01-02", 5.0, "COFFEE")])
+    monkeypatch.setattr(workspace, "PlaidManager", lambda env, directory: manager)
+    fake_plaid.accounts["tok-a"] = []
+    fake_plaid.add_sync("tok-a", [{}])
+
+    async def run() -> None:
+        ws = Workspace("alice", fake_plaid.url, tmp_path)
+        await ws.open()
+        try:
+            # The refresh is still queued, the stored data is already served
+            assert ws.scheduler.latest().status == "pending"
+            assert not ws.idle
+            assert ws.plaid_app.transactions_all["transaction_id"].tolist() == ["t1"]
+            await ws.scheduler.latest().wait()
+            assert ws.scheduler.latest().status == "succeeded"
+        finally:
+            await ws.close()
+
+    asyncio.run(run())
+
+
+def test_reloading_waits_for_the_evicted_copy_to_close(
+    fake_plaid, monkeypatch, tmp_path
+):
+    monkeypatch.setattr(plaid_manager, "get_plaid", lambda env: ("id", "secret", []))
+    monkeypatch.setattr(Workspaces, "root", tmp_path)
+    save_cache = PlaidManager.save_cache
+
+    def slow_save_cache(self) -> None:
+        time.sleep(0.2)
+        save_cache(self)
+
+    monkeypatch.setattr(PlaidManager, "save_cache", slow_save_cache)
+    workspaces = Workspaces(fake_plaid.url, max_users=1)
+
+    async def run() -> None:
+        try:
+            async with workspaces.lease("alice") as alice:
+                await alice.scheduler.latest().wait()
+            bob = asyncio.create_task(workspaces.acquire("bob"))
+            while "alice" in workspaces.loaded:
+                await asyncio.sleep(0.01)
+
+            # Alice comes back while her evicted workspace is still closing
+            async with workspaces.lease("alice") as alice:
+                await workspaces.release(await bob)
+                alice.plaid_app.add_rule("COFFEE", "name", "COFFEE")
+                assert alice.plaid_app.db.rules()["search_str"].tolist() == ["COFFEE"]
+        finally:
+            await workspaces.close()
+
+    asyncio.run(run())